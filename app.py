@@ -1,12 +1,20 @@
+import json
 import logging
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import Dict, List, Optional
 
-from config import API_HOST, API_PORT
-from chatbot_agents.chatbot_agent import ChatbotAgent
+from config import (
+    API_HOST, API_PORT, INFERENCE_RETRY_AFTER, ORDER_INGEST_BATCH_SIZE, TRACK_ORDERS_MAX_ITEMS,
+    TRACK_ORDERS_STREAM_THRESHOLD
+)
+from chatbot_agents.chatbot_agent import ChatbotAgent, ROUTE_MODEL
+from services.inference_pool import InferencePool, InferencePoolFullError
+from services.order_ingest import parse_order_update
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +33,9 @@ app = FastAPI(title="Customer Service Chatbot API")
 # Initialize the chatbot agent
 chatbot_agent = ChatbotAgent()
 
+# Language model calls run on a bounded pool so they never block the event loop
+inference_pool = InferencePool()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -39,12 +50,22 @@ class ChatRequest(BaseModel):
     message: str
     session_id: str
     context: Optional[Dict] = None
+    context_version: Optional[str] = None
+    no_cache: bool = False
 
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
-    context: Optional[Dict] = None
+    context_version: str = ""
+    context_delta: Dict = {}
+    context_full: bool = False
+
+
+class TrackOrdersRequest(BaseModel):
+    order_ids: List[str] = []
+    emails: List[str] = []
+    fields: Optional[List[str]] = None
 
 
 @app.get("/")
@@ -52,30 +73,133 @@ async def root():
     return {"message": "Customer Service Chatbot API is running"}
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    inference_pool.shutdown()
+    chatbot_agent.faq_service.shutdown()
+    if chatbot_agent.summarizer:
+        chatbot_agent.summarizer.shutdown()
+    # Last of the model's callers, so every prompt they queued is generated before it stops
+    chatbot_agent.model.scheduler.shutdown()
+    chatbot_agent.memory.shutdown()
+    if chatbot_agent.turn_log:
+        chatbot_agent.turn_log.close()
+
+
+@app.get("/stats")
+async def stats():
+    return {"inference_pool": inference_pool.stats(), **chatbot_agent.get_stats()}
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
         logger.debug(f"Received chat request: {request.message} (Session ID: {request.session_id})")
 
-        # Process the chat request using the chatbot agent
-        response, context = chatbot_agent.process_message(
-            request.message,
-            request.session_id,
-            request.context
+        # Decide whether the language model is needed without blocking the event loop
+        route = await run_in_threadpool(
+            chatbot_agent.classify_message, request.message, request.session_id, not request.no_cache
         )
 
+        if route[0] == ROUTE_MODEL:
+            # Model turns wait for a free inference worker
+            response, context_update = await inference_pool.run(
+                chatbot_agent.process_message,
+                request.message,
+                request.session_id,
+                request.context,
+                route,
+                request.context_version,
+                not request.no_cache
+            )
+        else:
+            # Order lookups, FAQ hits and cached answers bypass the inference queue
+            response, context_update = await run_in_threadpool(
+                chatbot_agent.process_message,
+                request.message,
+                request.session_id,
+                request.context,
+                route,
+                request.context_version,
+                not request.no_cache
+            )
+
         logger.debug(f"Generated response: {response} (Session ID: {request.session_id})")
 
         return ChatResponse(
             response=response,
             session_id=request.session_id,
-            context=context
+            **context_update
+        )
+    except InferencePoolFullError as e:
+        logger.warning(f"Rejecting chat request for session {request.session_id}: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
         )
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse_event(event: Dict) -> str:
+    """Format a stream event as a server-sent event."""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    try:
+        logger.debug(f"Received streaming chat request: {request.message} (Session ID: {request.session_id})")
+
+        # Decide whether the language model is needed without blocking the event loop
+        route = await run_in_threadpool(
+            chatbot_agent.classify_message, request.message, request.session_id, not request.no_cache
+        )
+
+        if route[0] == ROUTE_MODEL:
+            # Model turns hold an inference worker for the whole stream
+            events = inference_pool.stream(
+                chatbot_agent.stream_message,
+                request.message,
+                request.session_id,
+                request.context,
+                route,
+                request.context_version,
+                not request.no_cache
+            )
+
+            async def body():
+                async for event in events:
+                    yield _sse_event(event)
+        else:
+            # Order lookups, FAQ hits and cached answers bypass the inference queue
+            def body():
+                for event in chatbot_agent.stream_message(
+                        request.message,
+                        request.session_id,
+                        request.context,
+                        route,
+                        request.context_version,
+                        not request.no_cache
+                ):
+                    yield _sse_event(event)
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    except InferencePoolFullError as e:
+        logger.warning(f"Rejecting streaming chat request for session {request.session_id}: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+        )
+    except Exception as e:
+        logger.error(f"Error processing streaming chat request: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/faq", response_model=List[Dict])
 async def get_faqs():
     try:
@@ -86,6 +210,16 @@ async def get_faqs():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/faq/reload")
+async def reload_faqs():
+    try:
+        count = await run_in_threadpool(chatbot_agent.reload_faqs)
+        return {"message": f"Reloaded {count} FAQs"}
+    except Exception as e:
+        logger.error(f"Error reloading FAQs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/track_order/{order_id}")
 async def track_order(order_id: str):
     try:
@@ -97,6 +231,112 @@ async def track_order(order_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/track_orders")
+async def track_orders(request: TrackOrdersRequest):
+    count = len(request.order_ids) + len(request.emails)
+    if count > TRACK_ORDERS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {TRACK_ORDERS_MAX_ITEMS} order IDs and emails can be tracked per request"
+        )
+
+    try:
+        logger.debug(f"Tracking {len(request.order_ids)} orders and {len(request.emails)} emails")
+
+        # Small requests are answered with one batched lookup
+        if count <= TRACK_ORDERS_STREAM_THRESHOLD:
+            return await run_in_threadpool(
+                chatbot_agent.track_orders,
+                request.order_ids,
+                request.emails,
+                request.fields
+            )
+
+        # Large requests stream a JSON array, one batched lookup per chunk
+        size = TRACK_ORDERS_STREAM_THRESHOLD
+        chunks = [(request.order_ids[start:start + size], []) for start in range(0, len(request.order_ids), size)]
+        chunks += [([], request.emails[start:start + size]) for start in range(0, len(request.emails), size)]
+
+        # Look up the first chunk before the response starts, so a failing order store is still a 500
+        first = await run_in_threadpool(chatbot_agent.track_orders, *chunks[0], request.fields)
+
+        async def body():
+            separator = ""
+            yield "["
+
+            for index, (order_ids, emails) in enumerate(chunks):
+                results = first if index == 0 else await run_in_threadpool(
+                    chatbot_agent.track_orders, order_ids, emails, request.fields
+                )
+                for result in results:
+                    yield separator + json.dumps(result)
+                    separator = ","
+
+            yield "]"
+
+        return StreamingResponse(body(), media_type="application/json")
+
+    except Exception as e:
+        logger.error(f"Error tracking orders: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _iter_lines(request: Request):
+    """Yield the lines of a request body as they arrive."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+
+    if buffer:
+        yield buffer
+
+
+@app.post("/orders/bulk_upsert")
+async def bulk_upsert_orders(request: Request):
+    """Apply NDJSON order updates, one JSON object with an order_id per line."""
+    applied = 0
+    rejected = 0
+    errors = []
+    batch = []
+
+    try:
+        line_number = 0
+        async for line in _iter_lines(request):
+            line_number += 1
+            if not line.strip():
+                continue
+
+            try:
+                batch.append(parse_order_update(line))
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < 100:
+                    errors.append({"line": line_number, "error": str(e)})
+                continue
+
+            # Apply full batches while the rest of the body is still arriving
+            if len(batch) >= ORDER_INGEST_BATCH_SIZE:
+                batch_applied = await run_in_threadpool(chatbot_agent.upsert_orders, batch)
+                applied += batch_applied
+                rejected += len(batch) - batch_applied
+                batch = []
+
+        if batch:
+            batch_applied = await run_in_threadpool(chatbot_agent.upsert_orders, batch)
+            applied += batch_applied
+            rejected += len(batch) - batch_applied
+
+        logger.info(f"Bulk upsert applied {applied} order updates, rejected {rejected}")
+        return {"applied": applied, "rejected": rejected, "errors": errors}
+
+    except Exception as e:
+        logger.error(f"Error applying order updates: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Applied {applied} updates before failing: {str(e)}")
+
+
 @app.post("/reset_chat")
 async def reset_chat(request: Request):
     data = await request.json()
@@ -0,0 +1,151 @@
+"""
+Compare the embedding backends for parity with the PyTorch path and for latency.
+
+Usage:
+    python -m benchmarks.embedding_backend_benchmark --backends torch onnx onnx-int8 --batch-size 32
+
+The first backend listed is the reference. Texts are the FAQ questions plus the messages of
+data/intent_corpus.json. For every backend the harness reports load time, latency of a single
+query, time per text in batches, and how closely its embeddings match the reference: the
+minimum and mean cosine similarity per text, how often the top FAQ match is the same, and how
+often that match lands on the same side of FAQ_MATCH_THRESHOLD.
+
+A backend passes the parity check when its minimum cosine similarity reaches --min-cosine and
+every top FAQ match agrees on the threshold. The exit status is 1 if any backend fails.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import DATA_DIR, EMBEDDING_EXPORT_DIR, EMBEDDING_MODEL, FAQ_MATCH_THRESHOLD, FAQ_PATH
+from services.embeddings import EMBEDDING_BACKENDS, create_embeddings
+from services.faq_index import normalize_vectors
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_texts() -> Tuple[List[str], List[str]]:
+    """Load the FAQ questions and the labeled chat messages to embed."""
+    with open(FAQ_PATH, 'r') as f:
+        questions = [faq["question"] for faq in json.load(f)]
+
+    with open(os.path.join(DATA_DIR, "intent_corpus.json"), 'r') as f:
+        messages = [entry["message"] for entry in json.load(f)]
+
+    return questions, messages
+
+
+def embed(embeddings, texts: List[str], batch_size: int) -> np.ndarray:
+    """Embed texts in batches as unit vectors."""
+    vectors = [
+        embeddings.embed_documents(texts[start:start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ]
+    return normalize_vectors(np.asarray([vector for batch in vectors for vector in batch], dtype="float32"))
+
+
+def top_matches(queries: np.ndarray, questions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Find each query's most similar FAQ question and the cosine similarity."""
+    scores = queries @ questions.T
+    return scores.argmax(axis=1), scores.max(axis=1)
+
+
+def benchmark_backend(
+        backend: str,
+        questions: List[str],
+        messages: List[str],
+        args,
+        reference: Optional[Dict]
+) -> Tuple[Dict, Dict]:
+    """Load one backend, time it and compare its embeddings with the reference backend."""
+    start = time.perf_counter()
+    embeddings = create_embeddings(EMBEDDING_MODEL, backend, EMBEDDING_EXPORT_DIR)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up the runtime before timing
+    embeddings.embed_query(messages[0])
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for message in messages:
+            embeddings.embed_query(message)
+    query_ms = (time.perf_counter() - start) / (args.repeat * len(messages)) * 1000
+
+    texts = questions + messages
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        vectors = embed(embeddings, texts, args.batch_size)
+    batch_ms = (time.perf_counter() - start) / (args.repeat * len(texts)) * 1000
+
+    outputs = {"questions": vectors[:len(questions)], "messages": vectors[len(questions):]}
+    matches = top_matches(outputs["messages"], outputs["questions"])
+
+    row = {
+        "backend": backend,
+        "load_s": round(load_seconds, 2),
+        "query_ms": round(query_ms, 2),
+        f"batch{args.batch_size}_ms_per_text": round(batch_ms, 3)
+    }
+
+    if reference is not None:
+        cosines = (vectors * np.vstack([reference["questions"], reference["messages"]])).sum(axis=1)
+        reference_matches = reference["matches"]
+        threshold_agreement = float(np.mean(
+            (matches[1] >= FAQ_MATCH_THRESHOLD) == (reference_matches[1] >= FAQ_MATCH_THRESHOLD)
+        ))
+
+        row.update({
+            "min_cosine": round(float(cosines.min()), 4),
+            "mean_cosine": round(float(cosines.mean()), 4),
+            "top1_agreement": round(float(np.mean(matches[0] == reference_matches[0])), 3),
+            "threshold_agreement": round(threshold_agreement, 3),
+            "parity": "pass" if cosines.min() >= args.min_cosine and threshold_agreement == 1.0 else "FAIL"
+        })
+
+    outputs["matches"] = matches
+    return row, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per embed_documents call")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the texts when timing")
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="Lowest cosine similarity to the reference embedding that passes the parity check")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    questions, messages = load_texts()
+    results = []
+    reference = None
+
+    for backend in args.backends:
+        row, outputs = benchmark_backend(backend, questions, messages, args, reference)
+        results.append(row)
+        if reference is None:
+            reference = outputs
+
+    columns = list(results[-1].keys())
+    print(" | ".join(columns))
+    for row in results:
+        print(" | ".join(str(row.get(column, "-")) for column in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if any(row.get("parity") == "FAIL" for row in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Compare recall and latency of the FAQ index types on a large corpus.
+
+Usage:
+    python -m benchmarks.faq_index_benchmark --synthetic 200000 --nprobe 4 8 16 32 --ef-search 32 64 128
+    python -m benchmarks.faq_index_benchmark --corpus help_center.json
+
+With --corpus, the questions of a JSON list of {"question", "answer"} entries are embedded
+with EMBEDDING_MODEL. With --synthetic, clustered unit vectors stand in for a corpus of that
+size. Queries are corpus vectors with noise added, so their best matches range from near
+duplicates to unrelated questions.
+
+Exact inner-product search is the ground truth. For every index type and search setting
+the harness reports build time, recall@k, per-query latency, and how often the top match
+lands on the same side of FAQ_MATCH_THRESHOLD as the exact top match. That last figure
+shows whether the is_faq_question threshold still means the same thing.
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_MODEL, FAQ_MATCH_THRESHOLD, FAQ_PATH
+from services.faq_index import IndexSettings, build_index, normalize_vectors, tune_index
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def synthetic_corpus(count: int, dimension: int, seed: int) -> np.ndarray:
+    """Generate clustered unit vectors that resemble sentence embeddings of related questions."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 50), dimension)).astype("float32")
+    assignment = rng.integers(0, len(centers), size=count)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((count, dimension)).astype("float32")
+    return normalize_vectors(vectors)
+
+
+def embedded_corpus(path: str) -> np.ndarray:
+    """Embed the questions of a JSON corpus with the configured embedding model."""
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    with open(path, 'r') as f:
+        questions = [entry["question"] for entry in json.load(f)]
+
+    logger.info(f"Embedding {len(questions)} questions with {EMBEDDING_MODEL}")
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return normalize_vectors(np.asarray(embeddings.embed_documents(questions), dtype="float32"))
+
+
+def make_queries(corpus: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Perturb random corpus vectors with increasing noise to get queries of varying difficulty."""
+    rng = np.random.default_rng(seed + 1)
+    rows = rng.integers(0, len(corpus), size=count)
+    scale = np.linspace(0.0, noise, count, dtype="float32")[:, None]
+    return normalize_vectors(corpus[rows] + scale * rng.standard_normal((count, corpus.shape[1])).astype("float32"))
+
+
+def timed_search(index, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, List[float]]:
+    """Search one query at a time, as the chat service does, and time each search."""
+    scores = np.zeros((len(queries), k), dtype="float32")
+    ids = np.full((len(queries), k), -1, dtype="int64")
+    latencies = []
+
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        row_scores, row_ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        scores[row], ids[row] = row_scores[0], row_ids[0]
+
+    return scores, ids, latencies
+
+
+def measure(
+        label: str,
+        index,
+        queries: np.ndarray,
+        k: int,
+        exact: Tuple[np.ndarray, np.ndarray],
+        threshold: float,
+        build_seconds: float
+) -> Dict:
+    """Search with one configured index and compare it to the exact results."""
+    scores, ids, latencies = timed_search(index, queries, k)
+    exact_scores, exact_ids = exact
+
+    recall = np.mean([
+        len(set(row[row >= 0].tolist()) & set(expected.tolist())) / k
+        for row, expected in zip(ids, exact_ids)
+    ])
+    agreement = np.mean((scores[:, 0] >= threshold) == (exact_scores[:, 0] >= threshold))
+    latencies_ms = np.asarray(latencies) * 1000
+
+    return {
+        "index": label,
+        "build_seconds": round(build_seconds, 2),
+        f"recall@{k}": round(float(recall), 4),
+        "threshold_agreement": round(float(agreement), 4),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=FAQ_PATH, help="JSON list of FAQ entries to embed")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use this many synthetic vectors instead of --corpus")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.15, help="Largest noise scale added to query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=FAQ_MATCH_THRESHOLD)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists; 0 picks 4 * sqrt(corpus size)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=80)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic, args.dimension, args.seed)
+    else:
+        corpus = embedded_corpus(args.corpus)
+
+    k = min(args.k, len(corpus))
+    queries = make_queries(corpus, args.queries, args.noise, args.seed)
+    logger.info(f"Benchmarking {len(queries)} queries against {len(corpus)} vectors")
+
+    results = []
+
+    # Exact search is both the ground truth and the flat baseline
+    start = time.perf_counter()
+    flat = build_index(corpus, IndexSettings(index_type="flat"))
+    build_seconds = time.perf_counter() - start
+    exact_scores, exact_ids, _ = timed_search(flat, queries, k)
+    exact = (exact_scores, exact_ids)
+    results.append(measure("flat", flat, queries, k, exact, args.threshold, build_seconds))
+    del flat
+
+    settings = IndexSettings(index_type="ivf", ivf_nlist=args.nlist)
+    start = time.perf_counter()
+    ivf = build_index(corpus, settings)
+    build_seconds = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        tune_index(ivf, settings._replace(ivf_nprobe=nprobe))
+        label = f"ivf nlist={ivf.nlist} nprobe={ivf.nprobe}"
+        results.append(measure(label, ivf, queries, k, exact, args.threshold, build_seconds))
+    del ivf
+
+    settings = IndexSettings(index_type="hnsw", hnsw_m=args.hnsw_m, hnsw_ef_construction=args.ef_construction)
+    start = time.perf_counter()
+    hnsw = build_index(corpus, settings)
+    build_seconds = time.perf_counter() - start
+    for ef_search in args.ef_search:
+        tune_index(hnsw, settings._replace(hnsw_ef_search=ef_search))
+        label = f"hnsw M={args.hnsw_m} efSearch={ef_search}"
+        results.append(measure(label, hnsw, queries, k, exact, args.threshold, build_seconds))
+
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for row in results:
+        print(" | ".join(str(row[column]) for column in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
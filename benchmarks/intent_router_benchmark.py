@@ -0,0 +1,110 @@
+"""
+Compare the single-pass intent router with the regex cascade it replaced.
+
+Usage:
+    python -m benchmarks.intent_router_benchmark --repeat 2000
+
+Every message of the labeled corpus (data/intent_corpus.json) is classified by both
+routers. The harness reports accuracy against the labels, the messages each router gets
+wrong, and the time per message.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from chatbot_agents.intent_router import INTENT_EMAIL, INTENT_GENERAL, INTENT_ORDER, INTENT_TRACKING, route_message
+from config import DATA_DIR
+
+
+def cascade_route(message: str) -> Tuple[str, Optional[str]]:
+    """The previous routing: a tracking number search, then the order ID pattern cascade."""
+    matches = re.search(r"\bTRK-\d+\b", message, re.IGNORECASE)
+    if matches:
+        return INTENT_TRACKING, matches.group(0).upper()
+
+    patterns = [
+        r"order\s*#?\s*([A-Za-z0-9\-]+)",
+        r"tracking\s*.*\s*order\s*#?\s*([A-Za-z0-9\-]+)",
+        r"#\s*([A-Za-z0-9\-]+)",
+        r"ORD-\d+"
+    ]
+
+    for pattern in patterns:
+        matches = re.search(pattern, message, re.IGNORECASE)
+        if matches:
+            order_id = matches.group(1) if len(matches.groups()) > 0 else matches.group(0)
+            if re.match(r"^ORD-\d+$", order_id, re.IGNORECASE) or re.match(r"^[A-Za-z0-9\-]{6,}$", order_id):
+                return INTENT_ORDER, order_id
+
+    tracking_keywords = ["track", "order", "status", "where", "package"]
+    if any(keyword in message.lower() for keyword in tracking_keywords) and len(message.split()) < 10:
+        matches = re.search(r"([A-Za-z0-9\-]{6,})", message)
+        if matches:
+            return INTENT_ORDER, matches.group(1)
+
+    # The cascade had no email route
+    return INTENT_GENERAL, None
+
+
+def single_pass_route(message: str) -> Tuple[str, Optional[str]]:
+    """The compiled single-pass router."""
+    intent = route_message(message)
+    return intent.name, intent.value
+
+
+def measure(name: str, route: Callable, corpus: List[Dict], repeat: int) -> Dict:
+    """Score a router against the corpus labels and time it."""
+    misses = []
+    for entry in corpus:
+        result = route(entry["message"])
+        if result != (entry["intent"], entry["value"]):
+            misses.append(f"{entry['message']!r}: expected {entry['intent']}/{entry['value']}, got {result[0]}/{result[1]}")
+
+    messages = [entry["message"] for entry in corpus]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            route(message)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "router": name,
+        "accuracy": round(1 - len(misses) / len(corpus), 3),
+        "us_per_message": round(elapsed / (repeat * len(messages)) * 1e6, 2),
+        "misses": misses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(DATA_DIR, "intent_corpus.json"))
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus when timing")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r') as f:
+        corpus = json.load(f)
+
+    results = [
+        measure("regex cascade", cascade_route, corpus, args.repeat),
+        measure("single pass", single_pass_route, corpus, args.repeat)
+    ]
+
+    print(f"{len(corpus)} labeled messages ({sum(entry['intent'] == INTENT_EMAIL for entry in corpus)} with email intent)")
+    print("router | accuracy | us_per_message")
+    for row in results:
+        print(f"{row['router']} | {row['accuracy']} | {row['us_per_message']}")
+    for row in results:
+        for miss in row["misses"]:
+            print(f"  {row['router']} missed {miss}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
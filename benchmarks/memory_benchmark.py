@@ -0,0 +1,112 @@
+"""
+Measure the memory held per conversation session and the cost of appends and history reads.
+
+Usage:
+    python -m benchmarks.memory_benchmark --sessions 20000 --messages 30 --content-length 120
+
+Two layouts are compared: the previous list of {"role", "content"} dictionaries that was
+rebuilt with [-20:] once full, and the in-process session store's deque of Message records.
+Memory is measured with tracemalloc and includes the message text, which is the same for both.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from config import MAX_HISTORY_MESSAGES
+from services.session_store import InMemorySessionStore
+
+
+def list_layout(sessions: int, messages: int, content: str, history_limit: int) -> Callable:
+    """Fill sessions the way ConversationMemory used to, returning a history reader."""
+    conversations = {}
+
+    for session in range(sessions):
+        session_id = f"session-{session}"
+        for turn in range(messages):
+            history = conversations.setdefault(session_id, [])
+            history.append({"role": "user" if turn % 2 == 0 else "assistant", "content": content + str(turn)})
+            if len(history) > history_limit:
+                conversations[session_id] = history[-history_limit:]
+
+    return lambda session_id, count: conversations[session_id][-count:]
+
+
+def store_layout(sessions: int, messages: int, content: str, history_limit: int) -> Callable:
+    """Fill the in-process session store, returning a history reader."""
+    store = InMemorySessionStore(
+        max_sessions=sessions,
+        ttl_seconds=0,
+        max_bytes=1 << 62,
+        max_messages=history_limit
+    )
+
+    for session in range(sessions):
+        session_id = f"session-{session}"
+        for turn in range(messages):
+            store.append_messages(
+                session_id,
+                [{"role": "user" if turn % 2 == 0 else "assistant", "content": content + str(turn)}]
+            )
+
+    return store.get_messages
+
+
+def measure(name: str, layout: Callable, args) -> Dict:
+    """Build one layout under tracemalloc, then build it again untraced to time appends and reads."""
+    content = "x" * args.content_length
+
+    tracemalloc.start()
+    traced = layout(args.sessions, args.messages, content, args.history_limit)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    # Tracing slows every allocation, so timings come from a second, untraced build
+    start = time.perf_counter()
+    read = layout(args.sessions, args.messages, content, args.history_limit)
+    fill_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for session in range(args.sessions):
+        read(f"session-{session}", args.read_messages)
+    read_seconds = time.perf_counter() - start
+
+    appends = args.sessions * args.messages
+    return {
+        "layout": name,
+        "bytes_per_session": round(current / args.sessions),
+        "peak_mb": round(peak / (1024 * 1024), 1),
+        "us_per_append": round(fill_seconds / appends * 1e6, 2),
+        "us_per_read": round(read_seconds / args.sessions * 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=30, help="Messages appended to every session")
+    parser.add_argument("--content-length", type=int, default=120, help="Characters per message")
+    parser.add_argument("--history-limit", type=int, default=MAX_HISTORY_MESSAGES)
+    parser.add_argument("--read-messages", type=int, default=5, help="Newest messages read per history lookup")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results: List[Dict] = [
+        measure("list of dicts", list_layout, args),
+        measure("deque of Message", store_layout, args)
+    ]
+
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for row in results:
+        print(" | ".join(str(row[column]) for column in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
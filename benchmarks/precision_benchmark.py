@@ -0,0 +1,175 @@
+"""
+Compare accuracy and latency of the DeepSeek model across weight precisions.
+
+Usage:
+    python -m benchmarks.precision_benchmark --precisions fp32 bf16 int8 --max-new-tokens 64
+
+The first precision listed is the reference. For every mode the harness reports load
+time, serialized weight size, greedy decode latency and throughput, how many greedy
+tokens match the reference, and the perplexity of the FAQ answers given their questions.
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from config import FAQ_PATH
+from models.deepseek_model import DeepSeekModel, PRECISIONS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful customer service assistant for an e-commerce store."
+
+
+def load_faqs(limit: int) -> List[Dict]:
+    """Load up to limit FAQ entries to use as prompts and reference answers."""
+    with open(FAQ_PATH, 'r') as f:
+        return json.load(f)[:limit]
+
+
+def weight_bytes(model: torch.nn.Module) -> int:
+    """Measure the serialized size of a model's weights, including packed int8 weights."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def greedy_tokens(wrapper: DeepSeekModel, question: str, max_new_tokens: int) -> List[int]:
+    """Greedily generate a fixed number of tokens for a question."""
+    prompt = wrapper._format_prompt(question, SYSTEM_PROMPT)
+    inputs = wrapper.tokenizer(prompt, return_tensors="pt").to(wrapper.model.device)
+
+    with torch.no_grad():
+        output = wrapper.model.generate(
+            inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=wrapper.tokenizer.pad_token_id
+        )
+
+    return output[0][inputs.input_ids.shape[1]:].tolist()
+
+
+def answer_nll(wrapper: DeepSeekModel, question: str, answer: str) -> Tuple[float, int]:
+    """Sum the negative log-likelihood of an answer's tokens given its question."""
+    prompt_ids = wrapper.tokenizer(wrapper._format_prompt(question, SYSTEM_PROMPT))["input_ids"]
+    answer_ids = wrapper.tokenizer(answer, add_special_tokens=False)["input_ids"]
+
+    input_ids = torch.tensor([prompt_ids + answer_ids], device=wrapper.model.device)
+    labels = input_ids.clone()
+    labels[:, :len(prompt_ids)] = -100
+
+    with torch.no_grad():
+        loss = wrapper.model(input_ids, labels=labels).loss.float().item()
+
+    return loss * len(answer_ids), len(answer_ids)
+
+
+def benchmark_precision(
+        precision: str,
+        faqs: List[Dict],
+        max_new_tokens: int,
+        reference: Optional[List[List[int]]]
+) -> Tuple[Dict, List[List[int]]]:
+    """
+    Load the model in one precision and measure it.
+
+    Args:
+        precision: The precision mode to load
+        faqs: FAQ entries used as prompts and reference answers
+        max_new_tokens: Tokens generated per prompt
+        reference: Greedy outputs of the reference precision, or None if this is the reference
+
+    Returns:
+        A tuple of (result_row, greedy_outputs)
+    """
+    logger.info(f"Benchmarking precision {precision}")
+
+    start = time.perf_counter()
+    wrapper = DeepSeekModel(precision=precision)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up kernels and allocator before timing
+    greedy_tokens(wrapper, faqs[0]["question"], 4)
+
+    outputs = []
+    decode_seconds = 0.0
+    for faq in faqs:
+        start = time.perf_counter()
+        outputs.append(greedy_tokens(wrapper, faq["question"], max_new_tokens))
+        decode_seconds += time.perf_counter() - start
+
+    total_nll = 0.0
+    total_tokens = 0
+    for faq in faqs:
+        nll, count = answer_nll(wrapper, faq["question"], faq["answer"])
+        total_nll += nll
+        total_tokens += count
+
+    generated = sum(len(tokens) for tokens in outputs)
+    row = {
+        "precision": wrapper.precision,
+        "load_seconds": round(load_seconds, 1),
+        "weights_mb": round(weight_bytes(wrapper.model) / (1024 * 1024)),
+        "seconds_per_prompt": round(decode_seconds / len(faqs), 3),
+        "tokens_per_second": round(generated / decode_seconds, 1),
+        "answer_perplexity": round(float(torch.exp(torch.tensor(total_nll / max(total_tokens, 1)))), 3)
+    }
+
+    if reference is not None:
+        matched = sum(
+            sum(1 for a, b in zip(tokens, expected) if a == b)
+            for tokens, expected in zip(outputs, reference)
+        )
+        row["token_agreement"] = round(matched / max(sum(len(tokens) for tokens in reference), 1), 3)
+        row["exact_outputs"] = sum(1 for tokens, expected in zip(outputs, reference) if tokens == expected)
+    else:
+        row["token_agreement"] = 1.0
+        row["exact_outputs"] = len(faqs)
+
+    wrapper.scheduler.shutdown()
+    del wrapper
+    gc.collect()
+
+    return row, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "int8"], choices=PRECISIONS)
+    parser.add_argument("--prompts", type=int, default=8, help="Number of FAQ entries to use")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    faqs = load_faqs(args.prompts)
+    results = []
+    reference = None
+
+    for precision in args.precisions:
+        row, outputs = benchmark_precision(precision, faqs, args.max_new_tokens, reference)
+        results.append(row)
+        if reference is None:
+            reference = outputs
+
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for row in results:
+        print(" | ".join(str(row[column]) for column in columns))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
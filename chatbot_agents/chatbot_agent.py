@@ -1,15 +1,38 @@
 import logging
-import re
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Optional, Any
 
 from models.deepseek_model import DeepSeekModel
-from services.faq_retrieval import FAQRetrieval
-from services.memory import ConversationMemory
-from services.order_tracking import OrderTrackingService
+from models.reasoning import strip_reasoning
+from collections.abc import Mapping
+
+from chatbot_agents.intent_router import INTENT_ORDER, INTENT_TRACKING, route_message
+from config import (
+    HISTORY_TOKEN_BUDGET, SUMMARIZE_HISTORY, SUMMARY_MAX_TOKENS, TOKEN_COUNT_CACHE_SIZE, RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_MB, TURN_LOG_PATH
+)
+from services.cache import LRUCache
+from services.faq_retrieval import FAQRetrieval, normalize_query
+from services.history import HistorySummarizer, HistoryWindow
+from services.memory import ConversationMemory, SUMMARY_KEY, without_internal_keys
+from services.order_store import normalize_key
+from services.order_tracking import OrderTrackingService, project_order
+from services.turn_log import TurnLog
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Ways a message can be answered
+ROUTE_ORDER = "order"
+ROUTE_TRACKING = "tracking"
+ROUTE_FAQ = "faq"
+ROUTE_CACHED = "cached"
+ROUTE_MODEL = "model"
+
+
+def _response_size(key: str, response: str) -> int:
+    """Approximate the bytes held by one cached answer."""
+    return len(key) + len(response) + 200
+
 
 class ChatbotAgent:
     """
@@ -21,26 +44,49 @@ class ChatbotAgent:
         logger.info("Initializing chatbot agent")
 
         try:
+            # Define system prompt for the model
+            self.system_prompt = """
+            You are a helpful customer service assistant for an e-commerce store.
+            Your goal is to provide accurate, friendly, and helpful responses to customer inquiries.
+            Answer directly without revealing any internal chain-of-thought or reasoning process.
+            Keep your responses concise, friendly, and professional.
+            """
+
             # Initialize services
-            self.model = DeepSeekModel()
+            self.model = DeepSeekModel(system_prompt=self.system_prompt)
             logger.debug("Initialized DeepSeek model")
 
             self.faq_service = FAQRetrieval()
             logger.debug("Initialized FAQ retrieval service")
 
-            self.memory = ConversationMemory()
+            # Expired or evicted sessions also release their cached key/values
+            self.memory = ConversationMemory(on_evict=self.model.forget_session)
             logger.debug("Initialized conversation memory service")
 
+            # Prompts carry as much recent history as fits the token budget, plus a summary of the rest
+            self.history_window = HistoryWindow(
+                self.model.count_tokens,
+                HISTORY_TOKEN_BUDGET,
+                TOKEN_COUNT_CACHE_SIZE,
+                SUMMARY_MAX_TOKENS if SUMMARIZE_HISTORY else 0
+            )
+            self.summarizer = None
+            if SUMMARIZE_HISTORY:
+                self.summarizer = HistorySummarizer(self._summarize_history, self.memory, self.history_window)
+
             self.order_service = OrderTrackingService()
             logger.debug("Initialized order tracking service")
 
-            # Define system prompt for the model
-            self.system_prompt = """
-            You are a helpful customer service assistant for an e-commerce store.
-            Your goal is to provide accurate, friendly, and helpful responses to customer inquiries.
-            Answer directly without revealing any internal chain-of-thought or reasoning process.
-            Keep your responses concise, friendly, and professional.
-            """
+            # Repeated generic questions are answered from earlier model answers
+            self.response_cache = LRUCache(
+                RESPONSE_CACHE_SIZE,
+                RESPONSE_CACHE_TTL_SECONDS,
+                RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+                _response_size
+            )
+
+            # Questions the model answers are logged for offline FAQ mining
+            self.turn_log = TurnLog(TURN_LOG_PATH) if TURN_LOG_PATH else None
 
             logger.info("Chatbot agent initialized successfully")
 
@@ -48,11 +94,90 @@ class ChatbotAgent:
             logger.error(f"Error initializing chatbot agent: {str(e)}")
             raise RuntimeError(f"Failed to initialize chatbot agent: {str(e)}")
 
+    def classify_message(
+            self,
+            message: str,
+            session_id: Optional[str] = None,
+            use_cache: bool = True
+    ) -> Tuple[str, Optional[Any]]:
+        """
+        Decide how a message will be answered without generating a response.
+
+        Order lookups, FAQ hits and cached answers are answered deterministically, so
+        callers can use the route to keep them out of the language model queue.
+
+        Args:
+            message: The user's message
+            session_id: The session the message belongs to; needed to look up cached answers
+            use_cache: Whether a cached model answer may be used
+
+        Returns:
+            A tuple of (route, payload) where route is one of ROUTE_ORDER, ROUTE_TRACKING, ROUTE_FAQ,
+            ROUTE_CACHED or ROUTE_MODEL and payload is the order ID, the tracking number, the matched
+            FAQ entry or the cached answer
+        """
+        # Look for a tracking number, order ID or email address in one pass
+        intent = route_message(message)
+
+        if intent.name == INTENT_TRACKING:
+            logger.debug(f"Detected tracking number: {intent.value}")
+            return ROUTE_TRACKING, intent.value
+
+        if intent.name == INTENT_ORDER:
+            logger.debug(f"Detected order tracking request for order ID: {intent.value}")
+            return ROUTE_ORDER, intent.value
+
+        # An email address proves nothing about who is asking, so messages naming one are not
+        # answered with that address's orders; they go to the FAQs or the model like any question
+
+        # Check if message is an FAQ; the matched entry travels with the route
+        faq_entry = self._match_faq(message)
+        if faq_entry:
+            logger.debug("Detected FAQ question")
+            return ROUTE_FAQ, faq_entry
+
+        # The model may already have answered this exact question
+        if session_id is not None and use_cache:
+            cache_key = self._response_cache_key(message, session_id)
+            cached = self.response_cache.get(cache_key) if cache_key else None
+
+            # It can also reuse the answer to a question that means the same
+            if cached is None and cache_key:
+                cached = self.faq_service.find_cached_answer(message)
+
+            if cached is not None:
+                logger.debug("Using cached model response")
+                return ROUTE_CACHED, cached
+
+        # Otherwise, the language model has to answer
+        return ROUTE_MODEL, None
+
+    def _response_cache_key(self, message: str, session_id: str) -> Optional[str]:
+        """
+        Key a model answer by its normalized message, if it is the first message of its session.
+
+        Must be called before the message itself is added to the history.
+
+        Returns:
+            The cache key, or None if the answer must not be cached
+        """
+        if self.response_cache.max_entries <= 0:
+            return None
+
+        # Answers that follow earlier messages depend on them, and on whose conversation it is
+        if self.memory.get_conversation_history(session_id, max_messages=1):
+            return None
+
+        return normalize_query(message)
+
     def process_message(
             self,
             message: str,
             session_id: str,
-            context: Optional[Dict] = None
+            context: Optional[Dict] = None,
+            route: Optional[Tuple[str, Optional[Any]]] = None,
+            context_version: Optional[str] = None,
+            use_cache: bool = True
     ) -> Tuple[str, Dict]:
         """
         Process a user message and generate a response.
@@ -61,102 +186,170 @@ class ChatbotAgent:
             message: The user's message
             session_id: The unique identifier for the conversation session
             context: Additional context information
+            route: A route previously returned by classify_message for this message
+            context_version: The context version the client has, or None to receive the whole context
+            use_cache: Whether model answers may be served from and stored in the response cache
 
         Returns:
-            A tuple of (response, updated_context)
+            A tuple of (response, context_update), where context_update holds the new
+            "context_version", the "context_delta" of keys changed since context_version, and
+            "context_full" when the delta is the whole context
         """
         try:
             logger.debug(f"Processing message for session {session_id}: {message}")
 
             # Update context if provided
+            context = without_internal_keys(context)
             if context:
                 self.memory.update_context(session_id, context)
 
-            # Get current context
-            current_context = self.memory.get_context(session_id)
+            # Work out how to answer unless the caller already did
+            route_name, payload = route or self.classify_message(message, session_id, use_cache)
+
+            # Model answers are keyed before this message joins the history
+            cache_key = None
+            if route_name == ROUTE_MODEL and use_cache:
+                cache_key = self._response_cache_key(message, session_id)
 
             # Add user message to memory
             self.memory.add_message(session_id, "user", message)
 
-            # Check if message contains an order tracking request
-            order_id = self._extract_order_id(message)
-            if order_id:
-                logger.debug(f"Detected order tracking request for order ID: {order_id}")
-                response = self._handle_order_tracking(order_id)
-
-                # Update context with order information
+            if route_name == ROUTE_ORDER:
+                order_id = payload
                 order_info = self.order_service.get_order(order_id)
+                response = self._handle_order_tracking(order_id, order_info)
+
+                # Remember which order was tracked; the record itself stays in the order store
                 if order_info:
-                    self.memory.update_context(session_id, {"last_tracked_order": order_info})
+                    self.memory.update_context(session_id, {"last_tracked_order_id": order_info["order_id"]})
 
-            # Check if message is an FAQ
-            elif self._is_faq_question(message):
-                logger.debug("Detected FAQ question")
-                response = self._handle_faq_question(message)
+            elif route_name == ROUTE_TRACKING:
+                tracking_number = payload
+                order_info = self.order_service.get_order_by_tracking_number(tracking_number)
+
+                if order_info:
+                    response = self._handle_order_tracking(order_info["order_id"], order_info)
+                    self.memory.update_context(session_id, {"last_tracked_order_id": order_info["order_id"]})
+                else:
+                    response = f"I couldn't find a shipment with the tracking number {tracking_number}. Please check the number and try again, or share your order ID instead."
+
+            elif route_name == ROUTE_FAQ:
+                response = self._handle_faq_question(message, payload)
+
+            elif route_name == ROUTE_CACHED:
+                response = payload
 
             # Otherwise, use the language model for a response
             else:
                 logger.debug("Using language model for response")
-                response = self._generate_model_response(message, session_id)
+                response = self._generate_model_response(message, session_id, cache_key)
 
             # Add assistant response to memory
             self.memory.add_message(session_id, "assistant", response)
+            self._schedule_summary(session_id)
 
-            # Get updated context
-            updated_context = self.memory.get_context(session_id)
+            # Send back only what the client does not have yet
+            context_update = self._context_update(session_id, context_version)
 
             logger.debug(f"Generated response for session {session_id}: {response[:50]}...")
-            return response, updated_context
+            return response, context_update
 
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             return f"I'm sorry, I encountered an error while processing your request. Please try again later or contact our support team. (Error: {str(e)})", {}
 
-    def _extract_order_id(self, message: str) -> Optional[str]:
-        """Extract order ID from the message if present."""
+    def _context_update(self, session_id: str, context_version: Optional[str]) -> Dict[str, Any]:
+        """Describe the context changes since the client's version."""
+        version, delta, full = self.memory.get_context_delta(session_id, context_version)
+        return {"context_version": version, "context_delta": delta, "context_full": full}
+
+    def stream_message(
+            self,
+            message: str,
+            session_id: str,
+            context: Optional[Dict] = None,
+            route: Optional[Tuple[str, Optional[Any]]] = None,
+            context_version: Optional[str] = None,
+            use_cache: bool = True
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user message and stream the response as it is generated.
+
+        Args:
+            message: The user's message
+            session_id: The unique identifier for the conversation session
+            context: Additional context information
+            route: A route previously returned by classify_message for this message
+            context_version: The context version the client has, or None to receive the whole context
+            use_cache: Whether model answers may be served from and stored in the response cache
+
+        Returns:
+            An iterator of events: {"type": "token", "text": ...} for each chunk of the response,
+            then {"type": "done", "context_version": ..., "context_delta": ..., "context_full": ...}
+            or {"type": "error", "message": ...}
+        """
         try:
-            # Common order ID patterns
-            patterns = [
-                r"order\s*#?\s*([A-Za-z0-9\-]+)",
-                r"tracking\s*.*\s*order\s*#?\s*([A-Za-z0-9\-]+)",
-                r"#\s*([A-Za-z0-9\-]+)",
-                r"ORD-\d+"
-            ]
-
-            # Try each pattern
-            for pattern in patterns:
-                matches = re.search(pattern, message, re.IGNORECASE)
-                if matches:
-                    order_id = matches.group(1) if len(matches.groups()) > 0 else matches.group(0)
-
-                    # Validate that this looks like an order ID
-                    if re.match(r"^ORD-\d+$", order_id, re.IGNORECASE) or re.match(r"^[A-Za-z0-9\-]{6,}$", order_id):
-                        logger.debug(f"Extracted order ID: {order_id}")
-                        return order_id
-
-            # Check if message contains tracking keywords and is short (likely just an order number)
-            tracking_keywords = ["track", "order", "status", "where", "package"]
-            if any(keyword in message.lower() for keyword in tracking_keywords) and len(message.split()) < 10:
-                # Try to extract any alphanumeric sequence that could be an order ID
-                matches = re.search(r"([A-Za-z0-9\-]{6,})", message)
-                if matches:
-                    logger.debug(f"Extracted potential order ID from short message: {matches.group(1)}")
-                    return matches.group(1)
-
-            logger.debug("No order ID found in message")
-            return None
+            route = route or self.classify_message(message, session_id, use_cache)
+
+            # Deterministic answers are ready at once, so they arrive as a single chunk
+            if route[0] != ROUTE_MODEL:
+                response, context_update = self.process_message(
+                    message, session_id, context, route, context_version, use_cache
+                )
+                yield {"type": "token", "text": response}
+                yield {"type": "done", **context_update}
+                return
+
+            logger.debug(f"Streaming model response for session {session_id}: {message}")
+
+            # Update context if provided
+            context = without_internal_keys(context)
+            if context:
+                self.memory.update_context(session_id, context)
+
+            # The answer is keyed before this message joins the history
+            cache_key = self._response_cache_key(message, session_id) if use_cache else None
+
+            # Add user message to memory
+            self.memory.add_message(session_id, "user", message)
+
+            # Get the history that fits the prompt budget
+            history = self._build_history(message, session_id)
+
+            chunks = []
+            for chunk in self.model.stream_response(
+                    prompt=message,
+                    system_prompt=self.system_prompt,
+                    context=history,
+                    session_id=session_id
+            ):
+                chunks.append(chunk)
+                yield {"type": "token", "text": chunk}
+
+            # Add the complete assistant response to memory
+            response = "".join(chunks).strip()
+            self.memory.add_message(session_id, "assistant", response)
+            if cache_key and response:
+                self._cache_response(cache_key, message, response)
+            if self.turn_log and response:
+                self.turn_log.append(message, response, has_history=bool(history))
+            self._schedule_summary(session_id)
+
+            logger.debug(f"Streamed response for session {session_id}: {response[:50]}...")
+            yield {"type": "done", **self._context_update(session_id, context_version)}
 
         except Exception as e:
-            logger.error(f"Error extracting order ID: {str(e)}")
-            return None
+            logger.error(f"Error streaming message: {str(e)}")
+            yield {"type": "error", "message": "I'm sorry, I encountered an error while processing your request. Please try again later or contact our support team."}
 
-    def _handle_order_tracking(self, order_id: str) -> str:
-        """Generate a response for an order tracking request."""
+    def _handle_order_tracking(self, order_id: str, order_info: Optional[Dict] = None) -> str:
+        """Generate a response for an order tracking request, reusing the order if it was already looked up."""
         try:
             logger.debug(f"Handling order tracking for: {order_id}")
 
             # Get order information
-            order_info = self.order_service.get_order(order_id)
+            if order_info is None:
+                order_info = self.order_service.get_order(order_id)
 
             if not order_info:
                 return f"I couldn't find an order with the ID {order_id}. Please check that you've entered the correct order number and try again."
@@ -195,22 +388,25 @@ class ChatbotAgent:
             logger.error(f"Error handling order tracking: {str(e)}")
             return "I'm having trouble retrieving your order information at the moment. Please try again later or contact our customer support team for assistance."
 
-    def _is_faq_question(self, message: str) -> bool:
-        """Determine if the message is an FAQ question."""
+    def _match_faq(self, message: str) -> Optional[Dict]:
+        """Return the FAQ entry the message matches, or None if it is not an FAQ question."""
         try:
-            is_faq, _ = self.faq_service.is_faq_question(message)
-            return is_faq
+            is_faq, faq_entry = self.faq_service.is_faq_question(message)
+            return faq_entry if is_faq else None
 
         except Exception as e:
             logger.error(f"Error checking if message is FAQ: {str(e)}")
-            return False
+            return None
 
-    def _handle_faq_question(self, message: str) -> str:
-        """Generate a response for an FAQ question."""
+    def _handle_faq_question(self, message: str, faq_entry: Optional[Dict] = None) -> str:
+        """Generate a response for an FAQ question, reusing the entry matched during routing."""
         try:
             logger.debug("Handling FAQ question")
 
-            is_faq, faq_entry = self.faq_service.is_faq_question(message)
+            if faq_entry:
+                is_faq = True
+            else:
+                is_faq, faq_entry = self.faq_service.is_faq_question(message)
 
             if is_faq and faq_entry:
                 logger.debug(f"Found matching FAQ: {faq_entry['question']}")
@@ -230,21 +426,36 @@ class ChatbotAgent:
             logger.error(f"Error handling FAQ question: {str(e)}")
             return "I'm having trouble finding information about that right now. Let me help you with something else or connect you with a support agent."
 
-    def _generate_model_response(self, message: str, session_id: str) -> str:
-        """Generate a response using the language model."""
+    def _generate_model_response(
+            self,
+            message: str,
+            session_id: str,
+            cache_key: Optional[str] = None
+    ) -> str:
+        """Generate a response using the language model, caching it under cache_key if one is given."""
         try:
             logger.debug("Generating model response")
 
-            # Get conversation history
-            history = self.memory.get_conversation_history(session_id, max_messages=5)
+            # Get the history that fits the prompt budget
+            history = self._build_history(message, session_id)
 
-            # Generate response
+            # Generate response; failures are not cached
             response = self.model.generate_response(
                 prompt=message,
                 system_prompt=self.system_prompt,
-                context=history
+                context=history,
+                session_id=session_id,
+                raise_errors=True
             )
 
+            # Keep only the answer, as the stream does, so every path caches, stores and logs the same text
+            response = strip_reasoning(response)
+
+            if cache_key and response:
+                self._cache_response(cache_key, message, response)
+            if self.turn_log:
+                self.turn_log.append(message, response, has_history=bool(history))
+
             logger.debug(f"Model generated response: {response[:50]}...")
             return response
 
@@ -252,6 +463,44 @@ class ChatbotAgent:
             logger.error(f"Error generating model response: {str(e)}")
             return "I'm having trouble generating a response right now. Please try again or ask me something else."
 
+    def _cache_response(self, cache_key: str, message: str, response: str) -> None:
+        """Cache a first-turn model answer by its exact message and by the message's meaning."""
+        self.response_cache.put(cache_key, response)
+        self.faq_service.cache_answer(message, response)
+
+    def _build_history(self, message: str, session_id: str) -> List[Mapping]:
+        """Select the conversation history for a prompt: recent turns within the token budget, plus a summary."""
+        history = self.memory.get_conversation_history(session_id)
+
+        # The message being answered is already stored, but it is sent as the prompt itself
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+            history = history[:-1]
+
+        summary = self.memory.get_context(session_id).get(SUMMARY_KEY)
+        return self.history_window.build(history, summary)
+
+    def _schedule_summary(self, session_id: str) -> None:
+        """Fold turns that have left the history window into the session summary, after the response."""
+        if self.summarizer:
+            self.summarizer.schedule(session_id)
+
+    def _summarize_history(self, summary: Optional[str], messages: List[Mapping]) -> str:
+        """Ask the model to extend a conversation summary with older messages."""
+        lines = [
+            f"{'Customer' if message['role'] == 'user' else 'Assistant'}: {message['content']}"
+            for message in messages
+        ]
+
+        prompt = f"Summary so far: {summary}\n\n" if summary else ""
+        prompt += "Messages to add:\n" + "\n".join(lines) + "\n\nWrite the updated summary."
+
+        return self.model.complete(
+            prompt,
+            "You summarize customer service conversations. In at most three sentences, keep order numbers, "
+            "tracking numbers, emails, the customer's problem and anything still unresolved.",
+            SUMMARY_MAX_TOKENS
+        )
+
     def track_order(self, order_id: str) -> Dict:
         """
         Track an order by ID.
@@ -278,6 +527,58 @@ class ChatbotAgent:
             logger.error(f"Error tracking order {order_id}: {str(e)}")
             return {"error": f"Failed to track order: {str(e)}"}
 
+    def track_orders(
+            self,
+            order_ids: List[str],
+            emails: List[str],
+            fields: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """
+        Track many orders at once, by ID and by customer email.
+
+        Args:
+            order_ids: The IDs of the orders to track
+            emails: Customer emails whose orders should be returned
+            fields: The order fields to return, or None for whole orders
+
+        Returns:
+            One entry per requested ID, {"order_id", "found", "order"}, followed by
+            one entry per requested email, {"email", "orders"}
+        """
+        logger.debug(f"Tracking {len(order_ids)} orders and {len(emails)} emails")
+
+        orders = self.order_service.get_orders(order_ids) if order_ids else {}
+        orders_by_email = self.order_service.search_orders_by_emails(emails) if emails else {}
+
+        results = []
+        for order_id in order_ids:
+            order = orders.get(normalize_key(order_id))
+            if order:
+                results.append({"order_id": order_id, "found": True, "order": project_order(order, fields)})
+            else:
+                results.append({"order_id": order_id, "found": False})
+
+        for email in emails:
+            results.append({
+                "email": email,
+                "orders": [project_order(order, fields) for order in orders_by_email.get(normalize_key(email), [])]
+            })
+
+        return results
+
+    def upsert_orders(self, updates: List[Dict]) -> int:
+        """
+        Apply a batch of order updates.
+
+        Args:
+            updates: Order update dictionaries, each with an order_id and the fields that changed
+
+        Returns:
+            The number of updates applied
+        """
+        logger.debug(f"Applying {len(updates)} order updates")
+        return self.order_service.upsert_orders(updates)
+
     def get_faqs(self) -> List[Dict]:
         """
         Get all available FAQs.
@@ -293,6 +594,36 @@ class ChatbotAgent:
             logger.error(f"Error retrieving FAQs: {str(e)}")
             return []
 
+    def reload_faqs(self) -> int:
+        """
+        Reload the FAQ file and rebuild only the changed parts of the FAQ index.
+
+        Returns:
+            The number of FAQs now loaded
+        """
+        logger.info("Reloading FAQs")
+        return self.faq_service.reload()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get runtime statistics for the agent's services.
+
+        Returns:
+            A dictionary of statistics keyed by service
+        """
+        return {
+            "model": self.model.get_stats(),
+            "faq": self.faq_service.get_stats(),
+            "orders": self.order_service.get_stats(),
+            "memory": self.memory.stats(),
+            "response_cache": self.response_cache.stats(),
+            "history": {
+                "token_counts": self.history_window.token_counts.stats(),
+                **(self.summarizer.stats() if self.summarizer else {})
+            },
+            **({"turn_log": self.turn_log.stats()} if self.turn_log else {})
+        }
+
     def reset_conversation(self, session_id: str) -> None:
         """
         Reset the conversation for a session.
@@ -303,6 +634,7 @@ class ChatbotAgent:
         try:
             logger.debug(f"Resetting conversation for session {session_id}")
             self.memory.reset_session(session_id)
+            self.model.forget_session(session_id)
 
         except Exception as e:
             logger.error(f"Error resetting conversation for session {session_id}: {str(e)}")
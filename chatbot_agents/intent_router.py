@@ -0,0 +1,71 @@
+import re
+from typing import NamedTuple, Optional
+
+# Intents the router can recognize without a model
+INTENT_TRACKING = "tracking"
+INTENT_ORDER = "order"
+INTENT_EMAIL = "email"
+INTENT_GENERAL = "general"
+
+# Order IDs look like ORD-100001; "order #100001" refers to the same order
+ORDER_ID_PREFIX = "ORD-"
+
+# One alternation scanned once per message. The group that matched names the entity:
+#   tracking      a carrier tracking number, TRK-12345
+#   order         a full order ID, ORD-100001
+#   order_number  the digits of an order referenced as "order #100001", "order number 100001" or "#100001"
+#   email         an email address
+_INTENT_PATTERN = re.compile(
+    r"""
+    \b(?P<tracking>TRK-\d+)\b
+    | \b(?P<order>ORD-\d+)\b
+    | (?:\border\s*(?:number|no\.?)?\s*\#?|\#)\s*(?P<order_number>\d{4,})\b
+    | \b(?P<email>[\w.+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,})\b
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+
+class Intent(NamedTuple):
+    """What a message asks for, and the entity it names."""
+    name: str
+    value: Optional[str] = None
+
+
+def route_message(message: str) -> Intent:
+    """
+    Classify a message in a single pass over its text.
+
+    Tracking numbers take precedence over order IDs, and order IDs over email addresses.
+    Messages naming none of them are general questions, answered from the FAQs or by the model.
+    The chatbot answers email intents the same way: an address alone does not show that the
+    sender owns its orders.
+
+    Args:
+        message: The user's message
+
+    Returns:
+        The intent, with the normalized tracking number, order ID or email address as its value
+    """
+    order_id = None
+    email = None
+
+    for match in _INTENT_PATTERN.finditer(message):
+        kind = match.lastgroup
+
+        # Nothing outranks a tracking number, so stop scanning
+        if kind == "tracking":
+            return Intent(INTENT_TRACKING, match.group(kind).upper())
+        if kind == "order" and order_id is None:
+            order_id = match.group(kind).upper()
+        elif kind == "order_number" and order_id is None:
+            order_id = ORDER_ID_PREFIX + match.group(kind)
+        elif kind == "email" and email is None:
+            email = match.group(kind)
+
+    if order_id:
+        return Intent(INTENT_ORDER, order_id)
+    if email:
+        return Intent(INTENT_EMAIL, email)
+
+    return Intent(INTENT_GENERAL)
@@ -42,9 +42,19 @@ def initialize_session_state():
 
     if "context" not in st.session_state:
         st.session_state.context = {}
+        st.session_state.context_version = None
         logger.debug("Initialized empty context dictionary")
 
 
+def apply_context_update(data: dict):
+    """Merge the context changes the server sent back and remember its version."""
+    # A full context replaces ours, e.g. after the server's session was reset or expired
+    if data.get("context_full"):
+        st.session_state.context = {}
+    st.session_state.context.update(data.get("context_delta", {}))
+    st.session_state.context_version = data.get("context_version")
+
+
 def reset_conversation():
     """Reset the conversation state."""
     try:
@@ -56,6 +66,7 @@ def reset_conversation():
         if response.status_code == 200:
             st.session_state.messages = []
             st.session_state.context = {}
+            st.session_state.context_version = None
             logger.debug(f"Successfully reset conversation for session {st.session_state.session_id}")
             st.success("Conversation has been reset!")
         else:
@@ -80,14 +91,14 @@ def send_message(message: str):
                     json={
                         "message": message,
                         "session_id": st.session_state.session_id,
-                        "context": st.session_state.context
+                        "context_version": st.session_state.context_version
                     }
                 )
 
                 if response.status_code == 200:
                     data = response.json()
                     bot_response = data.get("response", "I couldn't process your request.")
-                    st.session_state.context = data.get("context", {})
+                    apply_context_update(data)
                     logger.debug(f"Received response: {bot_response}")
 
                     # Add bot response to chat history
@@ -103,41 +114,68 @@ def send_message(message: str):
                 st.session_state.messages.append(
                     {"role": "assistant", "content": f"Sorry, I encountered an error: {error_msg}"})
 
+def iter_stream_events(response):
+    """Yield the JSON events of a server-sent event stream."""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+
 def send_message(message: str):
+    """Send a message to the chatbot API and render the response as it streams in."""
     if message:
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": message})
 
-        with st.spinner("Thinking..."):
-            try:
-                logger.debug(f"Sending message to API: {message}")
-                response = requests.post(
-                    f"{API_URL}/chat",
-                    json={
-                        "message": message,
-                        "session_id": st.session_state.session_id,
-                        "context": st.session_state.context
-                    }
-                )
+        with st.chat_message("user"):
+            st.write(message)
 
-                if response.status_code == 200:
-                    data = response.json()
-                    bot_response = data.get("response", "I couldn't process your request.")
-
-                    # Filter out any chain-of-thought
-                    bot_response = filter_response(bot_response)
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("Thinking...")
 
-                    st.session_state.context = data.get("context", {})
-                    logger.debug(f"Received response: {bot_response}")
-
-                    # Add filtered bot response to chat history
-                    st.session_state.messages.append({"role": "assistant", "content": bot_response})
-                else:
-                    error_msg = f"Error: {response.status_code} - {response.text}"
-                    logger.error(error_msg)
-                    st.session_state.messages.append(
-                        {"role": "assistant", "content": f"Sorry, I encountered an error: {error_msg}"}
-                    )
+            try:
+                logger.debug(f"Streaming message to API: {message}")
+                with requests.post(
+                        f"{API_URL}/chat/stream",
+                        json={
+                            "message": message,
+                            "session_id": st.session_state.session_id,
+                            "context_version": st.session_state.context_version
+                        },
+                        stream=True
+                ) as response:
+                    if response.status_code == 200:
+                        bot_response = ""
+
+                        for event in iter_stream_events(response):
+                            if event["type"] == "token":
+                                bot_response += event["text"]
+                                placeholder.markdown(bot_response)
+                            elif event["type"] == "done":
+                                apply_context_update(event)
+                            elif event["type"] == "error":
+                                bot_response = f"Sorry, I encountered an error: {event['message']}"
+
+                        # The server already hides chain-of-thought; this guards older servers
+                        bot_response = filter_response(bot_response) or "I couldn't process your request."
+                        logger.debug(f"Received response: {bot_response}")
+
+                        # Add filtered bot response to chat history
+                        st.session_state.messages.append({"role": "assistant", "content": bot_response})
+                    elif response.status_code == 503:
+                        retry_after = response.headers.get("Retry-After", "a few")
+                        logger.warning(f"Chatbot service busy, retry after {retry_after} seconds")
+                        st.session_state.messages.append(
+                            {"role": "assistant",
+                             "content": f"I'm helping a lot of customers right now. Please try again in {retry_after} seconds."}
+                        )
+                    else:
+                        error_msg = f"Error: {response.status_code} - {response.text}"
+                        logger.error(error_msg)
+                        st.session_state.messages.append(
+                            {"role": "assistant", "content": f"Sorry, I encountered an error: {error_msg}"}
+                        )
             except Exception as e:
                 error_msg = f"Failed to communicate with the chatbot service: {str(e)}"
                 logger.error(error_msg)
@@ -146,8 +184,6 @@ def send_message(message: str):
                 )
 
 
-
-
 def track_order(order_id: str):
     """Track an order using the chatbot API."""
     try:
@@ -3,20 +3,87 @@ import os
 # Model settings
 MODEL_NAME = "deepseek-ai/DeepSeek-R1-Distill-Qwen-1.5B"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = "torch"  # "torch" (PyTorch eager), "onnx" or "onnx-int8" (ONNX Runtime; needs pip install onnxruntime)
+
+# Weight precision: "auto" (fp16 on GPU, fp32 on CPU), "fp32", "fp16", "bf16" or "int8" (CPU dynamic quantization)
+MODEL_PRECISION = "auto"
 
 # Model parameters
-MAX_LENGTH = 512
 TEMPERATURE = 0.7
+MAX_THINKING_TOKENS = 256  # New tokens allowed for <think> reasoning before it is forced closed
+MAX_ANSWER_TOKENS = 256  # New tokens allowed for the answer after the reasoning block
+SKIP_THINKING = False  # Answer customer-service turns directly with an empty reasoning block
 
 # API settings
 API_HOST = "0.0.0.0"
 API_PORT = 8000
 
+# Inference pool settings
+INFERENCE_WORKERS = 4  # Concurrent language model calls (keep >= BATCH_MAX_SIZE so batches can fill)
+INFERENCE_QUEUE_SIZE = 8  # Requests allowed to wait for a free worker
+INFERENCE_RETRY_AFTER = 5  # Seconds clients should wait when the queue is full
+
+# Generation batching settings
+BATCH_MAX_SIZE = 4  # Prompts generated together in one forward pass (1 disables batching)
+BATCH_MAX_WAIT_MS = 20  # How long the first prompt waits for others to join its batch
+
+# FAQ retrieval settings
+FAQ_CACHE_SIZE = 4096  # Normalized queries whose embeddings and top-k results are cached
+FAQ_BATCH_MAX_SIZE = 32  # Concurrent FAQ queries embedded and searched together (1 disables batching)
+FAQ_BATCH_MAX_WAIT_MS = 3  # How long the first FAQ query waits for others to join its batch
+FAQ_WATCH_INTERVAL = 0  # Seconds between checks of faqs.json for edits (0 disables the watcher)
+FAQ_MATCH_THRESHOLD = 0.83  # Cosine similarity above which a question is answered straight from the FAQ
+FAQ_INDEX_TYPE = "flat"  # "flat" (exact), "ivf" or "hnsw" for large corpora
+FAQ_IVF_NLIST = 0  # IVF lists; 0 picks 4 * sqrt(corpus size)
+FAQ_IVF_NPROBE = 8  # IVF lists scanned per query
+FAQ_HNSW_M = 32  # HNSW graph neighbours per node
+FAQ_HNSW_EF_CONSTRUCTION = 80  # HNSW candidate list size while building
+FAQ_HNSW_EF_SEARCH = 64  # HNSW candidate list size while searching
+
+# Order store settings
+ORDER_STORE = "sqlite"  # "sqlite" (indexed, on disk) or "dict" (everything in memory, for tests)
+ORDER_INGEST_BATCH_SIZE = 5000  # Order updates applied per batch by the ingestion API and event log
+ORDER_EVENT_POLL_INTERVAL = 1.0  # Seconds between checks of the order event log for new lines
+TRACK_ORDERS_MAX_ITEMS = 10000  # IDs plus emails accepted by one POST /track_orders request
+TRACK_ORDERS_STREAM_THRESHOLD = 200  # Larger requests are answered as a streamed JSON array, this many per lookup
+
+# Prompt history settings
+HISTORY_TOKEN_BUDGET = 512  # Tokens of conversation history (and summary) sent with each prompt
+SUMMARIZE_HISTORY = True  # Fold turns that no longer fit the budget into a rolling summary, in the background
+SUMMARY_MAX_TOKENS = 128  # New tokens allowed for each summary
+TOKEN_COUNT_CACHE_SIZE = 16384  # Messages whose token counts are cached
+
+# Response cache settings
+RESPONSE_CACHE_SIZE = 2048  # Model answers cached by normalized message (0 disables the cache)
+RESPONSE_CACHE_TTL_SECONDS = 3600  # Seconds a cached answer is served before the model is asked again
+RESPONSE_CACHE_MAX_MB = 16  # Approximate memory budget for cached answers
+SEMANTIC_CACHE_SIZE = 2048  # First-turn answers also found by question meaning (0 disables the semantic cache)
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity at or above which a cached answer is reused for a new question
+
+# Session memory settings
+SESSION_STORE = "memory"  # "memory" (this process only), "sqlite" (shared on one host) or "redis" (shared across hosts)
+SESSION_REDIS_URL = "redis://localhost:6379/0"  # "memory://" runs the Redis store on an in-process stand-in
+MAX_HISTORY_MESSAGES = 20  # Messages kept per conversation; the oldest are dropped first
+MAX_SESSIONS = 10000  # Conversations kept at once; the least recently used are evicted beyond this
+SESSION_TTL_SECONDS = 3600  # Idle time after which a conversation expires (0 disables expiry)
+SESSION_MEMORY_MAX_MB = 256  # Approximate memory budget for all conversation histories and contexts (memory store)
+SESSION_SWEEP_INTERVAL = 60  # Seconds between background sweeps for expired conversations
+
+# KV cache settings
+PREFIX_CACHE_MAX_MB = 512  # Memory budget for per-session past key/values (0 disables reuse)
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 FAQ_PATH = os.path.join(DATA_DIR, "faqs.json")
 ORDER_DATA_PATH = os.path.join(DATA_DIR, "orders.json")
+ORDER_DB_PATH = os.path.join(DATA_DIR, "orders.db")  # Seeded from orders.json when empty
+SESSION_DB_PATH = os.path.join(DATA_DIR, "sessions.db")
+ORDER_EVENT_LOG_PATH = None  # Append-only NDJSON log of order updates to follow (None disables it)
+TURN_LOG_PATH = None  # NDJSON log of model-answered questions for FAQ mining, e.g. os.path.join(DATA_DIR, "model_turns.ndjson")
+FAQ_CANDIDATES_PATH = os.path.join(DATA_DIR, "faq_candidates.json")  # Review file written by services.faq_mining
+FAQ_INDEX_DIR = os.path.join(DATA_DIR, "faq_index")
+EMBEDDING_EXPORT_DIR = os.path.join(DATA_DIR, "embedding_onnx")  # ONNX exports of the embedding model
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """
+    Collects concurrent requests into small batches and runs them on a single background thread.
+
+    Callers block in submit() while the scheduler waits up to max_wait_ms for more requests
+    to arrive, then hands the whole batch to run_batch and returns each caller its own result.
+    """
+
+    def __init__(
+            self,
+            run_batch: Callable[[List[Any]], List[Any]],
+            max_batch_size: int,
+            max_wait_ms: float,
+            batch_key: Optional[Callable[[Any], Hashable]] = None,
+            name: str = "batch-scheduler"
+    ):
+        """
+        Initialize the batch scheduler.
+
+        Args:
+            run_batch: Function that takes a list of items and returns one result per item
+            max_batch_size: The largest number of items passed to run_batch at once
+            max_wait_ms: How long to wait for more items after the first one arrives
+            batch_key: Optional function; only items with equal keys share a batch
+            name: Name of the background thread
+        """
+        logger.info(f"Initializing {name} (max batch size {max_batch_size}, max wait {max_wait_ms} ms)")
+
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.batch_key = batch_key or (lambda item: None)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Any:
+        """
+        Queue an item and wait for its result.
+
+        Args:
+            item: The item to process
+
+        Returns:
+            The result produced for this item by run_batch
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _collect(self) -> Optional[List]:
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if entry is None:
+                # Finish the current batch before stopping
+                self._queue.put(None)
+                break
+
+            pending.append(entry)
+
+        return pending
+
+    def _loop(self) -> None:
+        """Run batches until shutdown() is called."""
+        while True:
+            pending = self._collect()
+            if pending is None:
+                break
+
+            # Requests with different generation settings cannot share a batch
+            groups = OrderedDict()
+            for item, future in pending:
+                groups.setdefault(self.batch_key(item), []).append((item, future))
+
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group: List) -> None:
+        """Run one batch and resolve the futures of its callers."""
+        items = [item for item, _ in group]
+
+        try:
+            results = self.run_batch(items)
+
+            for (_, future), result in zip(group, results):
+                future.set_result(result)
+
+        except Exception as e:
+            logger.error(f"Error running batch of {len(items)} items: {str(e)}")
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+
+        with self._lock:
+            self._batches += 1
+            self._items += len(items)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get batching statistics.
+
+        Returns:
+            A dictionary with batch counts and the average batch size
+        """
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "average_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "queued": self._queue.qsize()
+            }
+
+    def shutdown(self) -> None:
+        """Stop the background thread after the queued requests have been served."""
+        self._queue.put(None)
+        self._thread.join()
@@ -1,39 +1,218 @@
 import logging
+import threading
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from typing import List, Dict, Any, Optional, Tuple
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    LogitsProcessor,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
+from typing import List, Dict, Any, Iterator, NamedTuple, Optional, Sequence, Tuple
 
-from config import MODEL_NAME, MAX_LENGTH, TEMPERATURE
+from config import (
+    MODEL_NAME,
+    MODEL_PRECISION,
+    TEMPERATURE,
+    MAX_THINKING_TOKENS,
+    MAX_ANSWER_TOKENS,
+    SKIP_THINKING,
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    PREFIX_CACHE_MAX_MB
+)
+from models.batching import BatchScheduler
+from models.kv_cache import (
+    LegacyCache,
+    PrefixKVCache,
+    common_prefix_length,
+    expand_cache,
+    gather_positions,
+    stack_caches,
+    to_dynamic_cache,
+    to_legacy_cache
+)
+from models.reasoning import THINK_END_MARKER, suppress_reasoning
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Appended to the prompt to start the answer right away with an empty reasoning block
+EMPTY_THINK_BLOCK = "<think>\n\n</think>\n\n"
+
+# Weight precisions that can be selected with MODEL_PRECISION
+PRECISIONS = ("auto", "fp32", "fp16", "bf16", "int8")
+
+
+def resolve_precision(precision: str, device: str) -> Tuple[torch.dtype, bool]:
+    """
+    Pick the load dtype for a precision mode on a device.
+
+    Args:
+        precision: One of PRECISIONS
+        device: "cuda" or "cpu"
+
+    Returns:
+        A tuple of (torch_dtype, quantize_int8)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+
+    if precision == "auto":
+        return (torch.float16 if device == "cuda" else torch.float32), False
+
+    if precision == "fp16" and device == "cpu":
+        # Many CPU kernels have no fp16 path; bf16 keeps the memory saving
+        logger.warning("fp16 is poorly supported on CPU, loading the model in bf16 instead")
+        return torch.bfloat16, False
+
+    if precision == "int8":
+        if device == "cuda":
+            logger.warning("Dynamic int8 quantization only runs on CPU, loading the model in fp16 instead")
+            return torch.float16, False
+        return torch.float32, True
+
+    return {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}[precision], False
+
+
+class GenerationSettings(NamedTuple):
+    """Decoding settings; only requests with equal settings are batched together."""
+    temperature: float
+    max_thinking_tokens: int
+    max_answer_tokens: int
+    skip_thinking: bool
+
+
+class _StopOnEvent(StoppingCriteria):
+    """Stops generation once an event is set, e.g. when a streaming client goes away."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+
+def _answer_start(generated: torch.Tensor, think_end_id: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """For each row, find whether the reasoning block has closed and where the answer starts."""
+    is_end = generated == think_end_id
+    closed = is_end.any(dim=1)
+    return closed, is_end.int().argmax(dim=1) + 1
+
+
+class _ThinkingBudget(LogitsProcessor):
+    """Forces the end of the reasoning block in rows that have used up their reasoning budget."""
+
+    def __init__(self, prompt_length: int, think_end_id: int, max_thinking_tokens: int):
+        self.prompt_length = prompt_length
+        self.think_end_id = think_end_id
+        self.max_thinking_tokens = max_thinking_tokens
+
+    def __call__(self, input_ids, scores):
+        generated = input_ids[:, self.prompt_length:]
+        if generated.shape[1] < self.max_thinking_tokens:
+            return scores
+
+        closed, _ = _answer_start(generated, self.think_end_id)
+        force = ~closed
+        if force.any():
+            scores[force] = float("-inf")
+            scores[force, self.think_end_id] = 0.0
+
+        return scores
+
+
+class _AnswerBudget(StoppingCriteria):
+    """Stops each row once its answer, counted after the reasoning block, reaches the answer budget."""
+
+    def __init__(self, prompt_length: int, think_end_id: Optional[int], max_answer_tokens: int):
+        self.prompt_length = prompt_length
+        self.think_end_id = think_end_id
+        self.max_answer_tokens = max_answer_tokens
+
+    def __call__(self, input_ids, scores, **kwargs) -> torch.BoolTensor:
+        generated = input_ids[:, self.prompt_length:]
+        length = generated.shape[1]
+
+        if self.think_end_id is None:
+            answer_tokens = torch.full((generated.shape[0],), length, device=input_ids.device)
+        else:
+            closed, start = _answer_start(generated, self.think_end_id)
+            answer_tokens = torch.where(closed, length - start, torch.zeros_like(start))
+
+        return answer_tokens >= self.max_answer_tokens
+
 
 class DeepSeekModel:
     """
     A wrapper for the DeepSeek model that handles text generation and model loading.
     """
 
-    def __init__(self):
-        """Initialize the DeepSeek model."""
+    def __init__(self, system_prompt: Optional[str] = None, precision: str = MODEL_PRECISION):
+        """
+        Initialize the DeepSeek model.
+
+        Args:
+            system_prompt: Optional system prompt whose KV cache is computed once and shared by every generation
+            precision: Weight precision, one of PRECISIONS
+        """
         logger.info(f"Initializing DeepSeek model: {MODEL_NAME}")
 
         try:
             self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+
+            # Batched prompts are left-padded so every row ends right where generation starts
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
             logger.debug("Tokenizer loaded successfully")
 
+            # Token that closes the reasoning block, if the model has one
+            think_end_ids = self.tokenizer.encode(THINK_END_MARKER, add_special_tokens=False)
+            self.think_end_id = think_end_ids[0] if len(think_end_ids) == 1 else None
+
             # Check if CUDA is available
             device = "cuda" if torch.cuda.is_available() else "cpu"
             logger.debug(f"Using device: {device}")
 
             # Load the model
+            dtype, quantize_int8 = resolve_precision(precision, device)
             self.model = AutoModelForCausalLM.from_pretrained(
                 MODEL_NAME,
-                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+                torch_dtype=dtype,
                 low_cpu_mem_usage=True,
                 device_map=device
             )
-            logger.info(f"Model loaded successfully on {device}")
+
+            # Swap the Linear layers for int8 kernels; activations are quantized on the fly
+            if quantize_int8:
+                self.model = torch.ao.quantization.quantize_dynamic(
+                    self.model,
+                    {torch.nn.Linear},
+                    dtype=torch.qint8
+                )
+
+            self.model.eval()
+            self.precision = "int8" if quantize_int8 else str(dtype).replace("torch.", "")
+            logger.info(f"Model loaded successfully on {device} ({self.precision})")
+
+            # Past key/values of recent sessions, so follow-up turns only prefill new tokens
+            self.prefix_cache = PrefixKVCache(max_bytes=PREFIX_CACHE_MAX_MB * 1024 * 1024)
+
+            # Past key/values of the system prompt, which every conversation starts with
+            self.system_prefix_ids, self.system_prefix_cache = self._build_system_prefix(system_prompt)
+            self._system_prefix_hits = 0
+
+            # Concurrent requests are grouped into batched generate calls on one thread
+            self.scheduler = BatchScheduler(
+                run_batch=self._generate_batch,
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                batch_key=lambda item: item[2],
+                name="generation-batcher"
+            )
 
         except Exception as e:
             logger.error(f"Error loading DeepSeek model: {str(e)}")
@@ -43,9 +222,13 @@ class DeepSeekModel:
             self,
             prompt: str,
             system_prompt: Optional[str] = None,
-            max_length: int = MAX_LENGTH,
             temperature: float = TEMPERATURE,
-            context: Optional[List[Dict[str, str]]] = None
+            context: Optional[List[Dict[str, str]]] = None,
+            session_id: Optional[str] = None,
+            max_thinking_tokens: int = MAX_THINKING_TOKENS,
+            max_answer_tokens: int = MAX_ANSWER_TOKENS,
+            skip_thinking: bool = SKIP_THINKING,
+            raise_errors: bool = False
     ) -> str:
         """
         Generate a response from the model based on the given prompt.
@@ -53,9 +236,13 @@ class DeepSeekModel:
         Args:
             prompt: The user's input prompt
             system_prompt: Optional system prompt to guide the model's behavior
-            max_length: Maximum length of the generated response
             temperature: Temperature parameter for generation (higher = more creative)
             context: List of previous conversation messages
+            session_id: Optional session ID used to reuse the cached prefix of earlier turns
+            max_thinking_tokens: New tokens allowed for the reasoning block before it is closed
+            max_answer_tokens: New tokens allowed for the answer after the reasoning block
+            skip_thinking: Start the answer right away with an empty reasoning block
+            raise_errors: Raise generation errors instead of returning an apology as the response
 
         Returns:
             The generated text response
@@ -63,47 +250,466 @@ class DeepSeekModel:
         try:
             logger.debug(f"Generating response for prompt: {prompt[:50]}...")
 
-            # Prepare the conversation history if provided
-            messages = []
+            # Format the conversation for the model
+            formatted_prompt = self._format_prompt(prompt, system_prompt, context, skip_thinking)
+            settings = GenerationSettings(temperature, max_thinking_tokens, max_answer_tokens, skip_thinking)
+
+            # Wait for the scheduler to run this prompt as part of a batch
+            response = self.scheduler.submit((formatted_prompt, session_id, settings))
+
+            logger.debug(f"Generated response: {response[:50]}...")
+            return response
+
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            if raise_errors:
+                raise
+            return f"I'm having trouble processing your request. Please try again later. (Error: {str(e)})"
 
-            # Add system prompt if provided
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
+    def complete(
+            self,
+            prompt: str,
+            system_prompt: str,
+            max_answer_tokens: int,
+            temperature: float = 0.3
+    ) -> str:
+        """
+        Generate a short answer without reasoning for internal tasks such as summaries.
 
-            # Add conversation history if provided
-            if context:
-                messages.extend(context)
+        Unlike generate_response, errors are raised instead of being turned into a reply.
 
-            # Add the current user prompt
-            messages.append({"role": "user", "content": prompt})
+        Args:
+            prompt: The task prompt
+            system_prompt: Instructions for the task
+            max_answer_tokens: New tokens allowed for the answer
+            temperature: Temperature parameter for generation
 
-            # Format the conversation for the model
-            formatted_prompt = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
+        Returns:
+            The generated text
+        """
+        formatted_prompt = self._format_prompt(prompt, system_prompt, skip_thinking=True)
+        settings = GenerationSettings(temperature, MAX_THINKING_TOKENS, max_answer_tokens, True)
+        return self.scheduler.submit((formatted_prompt, None, settings))
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of a text as the model sees it.
+
+        Args:
+            text: The text to count
+
+        Returns:
+            The number of tokens, without special tokens
+        """
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def stream_response(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            temperature: float = TEMPERATURE,
+            context: Optional[List[Dict[str, str]]] = None,
+            session_id: Optional[str] = None,
+            max_thinking_tokens: int = MAX_THINKING_TOKENS,
+            max_answer_tokens: int = MAX_ANSWER_TOKENS,
+            skip_thinking: bool = SKIP_THINKING
+    ) -> Iterator[str]:
+        """
+        Stream a response from the model as it is generated.
+
+        The reasoning block is suppressed, so the first chunk is the first visible
+        token of the answer.
+
+        Args:
+            prompt: The user's input prompt
+            system_prompt: Optional system prompt to guide the model's behavior
+            temperature: Temperature parameter for generation (higher = more creative)
+            context: List of previous conversation messages
+            session_id: Optional session ID used to reuse the cached prefix of earlier turns
+            max_thinking_tokens: New tokens allowed for the reasoning block before it is closed
+            max_answer_tokens: New tokens allowed for the answer after the reasoning block
+            skip_thinking: Start the answer right away with an empty reasoning block
+
+        Returns:
+            An iterator over chunks of the answer text
+        """
+        logger.debug(f"Streaming response for prompt: {prompt[:50]}...")
+
+        formatted_prompt = self._format_prompt(prompt, system_prompt, context, skip_thinking)
+        token_ids = self.tokenizer(formatted_prompt)["input_ids"]
+        past_length, past = self._find_past(session_id, token_ids)
+        settings = GenerationSettings(temperature, max_thinking_tokens, max_answer_tokens, skip_thinking)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop_event = threading.Event()
+
+        def generate():
+            try:
+                input_ids = torch.tensor([token_ids], device=self.model.device)
+                generate_kwargs = self._budget_kwargs(settings, len(token_ids))
+                generate_kwargs["stopping_criteria"].append(_StopOnEvent(stop_event))
+                if past is not None:
+                    generate_kwargs["past_key_values"] = to_dynamic_cache(past)
+                    self._record_prefix_use(past_length)
+
+                with torch.no_grad():
+                    output = self.model.generate(
+                        input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        temperature=temperature,
+                        do_sample=temperature > 0,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        streamer=streamer,
+                        return_dict_in_generate=True,
+                        **generate_kwargs
+                    )
+
+                if session_id:
+                    self._remember_session(
+                        session_id, output.sequences[0], to_legacy_cache(output.past_key_values), 0,
+                        range(len(token_ids)), len(token_ids)
+                    )
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                streamer.end()
+
+        # generate() pushes text into the streamer from its own thread
+        thread = threading.Thread(target=generate, name="generation-stream", daemon=True)
+        thread.start()
+
+        try:
+            # With an empty reasoning block in the prompt there is nothing to hold back
+            yield from (streamer if skip_thinking else suppress_reasoning(streamer))
+        finally:
+            # Stop decoding early if the consumer stopped reading
+            stop_event.set()
+
+    def _format_prompt(
+            self,
+            prompt: str,
+            system_prompt: Optional[str] = None,
+            context: Optional[List[Dict[str, str]]] = None,
+            skip_thinking: bool = False
+    ) -> str:
+        """Render the system prompt, history and user prompt with the chat template."""
+        # Prepare the conversation history if provided
+        messages = []
+
+        # Add system prompt if provided
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+
+        # Add conversation history if provided
+        if context:
+            messages.extend({"role": message["role"], "content": message["content"]} for message in context)
+
+        # Add the current user prompt
+        messages.append({"role": "user", "content": prompt})
+
+        formatted_prompt = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+
+        # Close the reasoning block before the model can open it
+        if skip_thinking:
+            if formatted_prompt.rstrip().endswith("<think>"):
+                formatted_prompt = formatted_prompt.rstrip() + "\n\n</think>\n\n"
+            else:
+                formatted_prompt += EMPTY_THINK_BLOCK
+
+        return formatted_prompt
+
+    def _budget_kwargs(self, settings: GenerationSettings, prompt_length: int) -> Dict[str, Any]:
+        """
+        Build the generate() arguments that enforce the reasoning and answer budgets.
+
+        Args:
+            settings: The decoding settings of the request
+            prompt_length: The (padded) prompt length; later tokens are generated
+
+        Returns:
+            Keyword arguments with max_new_tokens, logits_processor and stopping_criteria
+        """
+        thinking = not settings.skip_thinking and self.think_end_id is not None
+        logits_processor = LogitsProcessorList()
+
+        if thinking:
+            logits_processor.append(_ThinkingBudget(prompt_length, self.think_end_id, settings.max_thinking_tokens))
+            max_new_tokens = settings.max_thinking_tokens + 1 + settings.max_answer_tokens
+        else:
+            max_new_tokens = settings.max_answer_tokens
+
+        stopping_criteria = StoppingCriteriaList([
+            _AnswerBudget(prompt_length, self.think_end_id if thinking else None, settings.max_answer_tokens)
+        ])
+
+        return {
+            "max_new_tokens": max_new_tokens,
+            "logits_processor": logits_processor,
+            "stopping_criteria": stopping_criteria
+        }
+
+    def _build_system_prefix(self, system_prompt: Optional[str]) -> Tuple[List[int], Optional[LegacyCache]]:
+        """
+        Tokenize and prefill the part of every prompt that only depends on the system prompt.
+
+        Args:
+            system_prompt: The system prompt, or None to skip precomputation
+
+        Returns:
+            A tuple of (prefix_token_ids, prefix_cache)
+        """
+        if not system_prompt:
+            return [], None
+
+        # The shared prefix is whatever conversations with different openings have in common
+        renders = [
+            self.tokenizer(self._format_prompt(prompt, system_prompt, context))["input_ids"]
+            for prompt, context in [
+                ("a", None),
+                ("b", None),
+                ("b", [{"role": "assistant", "content": "a"}])
+            ]
+        ]
+        length = min(common_prefix_length(renders[0], other) for other in renders[1:])
+        prefix_ids = renders[0][:length]
+
+        if not prefix_ids:
+            return [], None
+
+        with torch.no_grad():
+            output = self.model(torch.tensor([prefix_ids], device=self.model.device), use_cache=True)
+
+        logger.info(f"Precomputed the KV cache of a {length}-token system prompt prefix")
+        return prefix_ids, to_legacy_cache(output.past_key_values)
+
+    def _has_system_prefix(self, token_ids: List[int]) -> bool:
+        """Check whether a prompt starts with the precomputed system prompt prefix."""
+        length = len(self.system_prefix_ids)
+        return 0 < length < len(token_ids) and token_ids[:length] == self.system_prefix_ids
+
+    def _record_prefix_use(self, past_length: int) -> None:
+        """Count generations that started from the shared system prompt prefix."""
+        if self.system_prefix_cache is not None and past_length == len(self.system_prefix_ids):
+            self._system_prefix_hits += 1
+
+    def _find_past(self, session_id: Optional[str], token_ids: List[int]) -> Tuple[int, Optional[LegacyCache]]:
+        """
+        Find the longest cached prefix of a prompt.
+
+        Args:
+            session_id: The session the prompt belongs to, if any
+            token_ids: The token IDs of the prompt
+
+        Returns:
+            A tuple of (cached_length, cache), or (0, None) if nothing is cached
+        """
+        if session_id:
+            past_length, past = self.prefix_cache.lookup(session_id, token_ids)
+            if past is not None:
+                return past_length, past
+
+        if self._has_system_prefix(token_ids):
+            return len(self.system_prefix_ids), self.system_prefix_cache
+
+        return 0, None
+
+    def _generate_batch(self, items: List[Tuple[str, Optional[str], GenerationSettings]]) -> List[str]:
+        """
+        Generate responses for a batch of formatted prompts.
+
+        Prompts that start from a cached prefix, either their session's or the system
+        prompt's, share one generate call over their per-row caches. The rest share a
+        second call that prefills them from scratch.
+
+        Args:
+            items: Tuples of (formatted_prompt, session_id, settings) sharing the same settings
+
+        Returns:
+            The decoded response for each prompt, in order
+        """
+        settings = items[0][2]
+        logger.debug(f"Generating a batch of {len(items)} responses")
+
+        responses = [None] * len(items)
+        cached = []
+        plain = []
+
+        for index, (prompt, session_id, _) in enumerate(items):
+            token_ids = self.tokenizer(prompt)["input_ids"]
+            past_length, past = self._find_past(session_id, token_ids)
+
+            if past is not None:
+                cached.append((index, token_ids, session_id, past, past_length))
+            else:
+                plain.append((index, token_ids, session_id, None, 0))
+
+        for group in (cached, plain):
+            if not group:
+                continue
+
+            results = self._generate_rows(
+                [token_ids for _, token_ids, _, _, _ in group],
+                [session_id for _, _, session_id, _, _ in group],
+                settings,
+                [past for _, _, _, past, _ in group] if group is cached else None,
+                [past_length for _, _, _, _, past_length in group]
+            )
+            for (index, _, _, _, _), response in zip(group, results):
+                responses[index] = response
+
+        return responses
+
+    def _generate_rows(
+            self,
+            token_ids: List[List[int]],
+            session_ids: List[Optional[str]],
+            settings: GenerationSettings,
+            pasts: Optional[List[LegacyCache]] = None,
+            past_lengths: Optional[List[int]] = None
+    ) -> List[str]:
+        """
+        Run one generate call over tokenized prompts and decode each row.
+
+        Rows are laid out as their left-padded cached prefix followed by the left-padded
+        rest of the prompt. The attention mask skips both paddings, so position IDs match
+        the ones each cached prefix was computed with. A prefix shared by every row is
+        expanded across the batch without copying.
+
+        Args:
+            token_ids: The token IDs of each prompt
+            session_ids: The session of each prompt, whose cache is stored after generation
+            settings: The decoding settings shared by every prompt
+            pasts: Optional single-row past key/values per prompt, covering its first past_lengths tokens
+            past_lengths: The number of leading tokens of each prompt covered by its past
+
+        Returns:
+            The decoded response for each prompt, in order
+        """
+        batch_size = len(token_ids)
+        prompt_lengths = [len(ids) for ids in token_ids]
+        past_lengths = past_lengths if pasts is not None else [0] * batch_size
+        prefix_length = max(past_lengths)
+
+        # Left-pad the cached prefixes to a common length
+        prefix = torch.full((batch_size, prefix_length), self.tokenizer.pad_token_id, dtype=torch.long)
+        prefix_mask = torch.zeros((batch_size, prefix_length), dtype=torch.long)
+        for row, (ids, past_length) in enumerate(zip(token_ids, past_lengths)):
+            if past_length:
+                prefix[row, prefix_length - past_length:] = torch.tensor(ids[:past_length], dtype=torch.long)
+                prefix_mask[row, prefix_length - past_length:] = 1
+
+        # Left-pad what follows each prefix to a common length
+        suffixes = self.tokenizer.pad(
+            {"input_ids": [ids[past_length:] for ids, past_length in zip(token_ids, past_lengths)]},
+            return_tensors="pt"
+        )
+
+        input_ids = torch.cat([prefix, suffixes.input_ids], dim=1).to(self.model.device)
+        attention_mask = torch.cat([prefix_mask, suffixes.attention_mask], dim=1).to(self.model.device)
+        padded_length = input_ids.shape[1]
+
+        # Budgets are tracked per row, so rows that finish early stop counting
+        generate_kwargs = self._budget_kwargs(settings, padded_length)
+        if pasts is not None:
+            if all(past is pasts[0] for past in pasts):
+                past = expand_cache(pasts[0], batch_size)
+            else:
+                past = stack_caches(pasts, prefix_length)
+            generate_kwargs["past_key_values"] = to_dynamic_cache(past)
+            for past_length in past_lengths:
+                self._record_prefix_use(past_length)
+
+        # Generate the responses
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                temperature=settings.temperature,
+                do_sample=settings.temperature > 0,
+                pad_token_id=self.tokenizer.pad_token_id,
+                return_dict_in_generate=True,
+                **generate_kwargs
             )
 
-            # Tokenize the prompt
-            inputs = self.tokenizer(formatted_prompt, return_tensors="pt").to(self.model.device)
-
-            # Generate the response
-            with torch.no_grad():
-                output = self.model.generate(
-                    inputs.input_ids,
-                    max_length=max_length,
-                    temperature=temperature,
-                    do_sample=temperature > 0,
-                    pad_token_id=self.tokenizer.eos_token_id
+        legacy_cache = to_legacy_cache(output.past_key_values)
+
+        # Decode each row, skipping the padded prompt
+        responses = []
+        for row, (prompt_length, session_id) in enumerate(zip(prompt_lengths, session_ids)):
+            sequence = output.sequences[row]
+            response_ids = sequence[padded_length:]
+            responses.append(self.tokenizer.decode(response_ids, skip_special_tokens=True).strip())
+
+            if session_id:
+                prompt_positions = attention_mask[row].nonzero().flatten().tolist()
+                self._remember_session(
+                    session_id, sequence, legacy_cache, row, prompt_positions, padded_length
                 )
 
-            # Decode the response, skipping the input prompt
-            response_ids = output[0][inputs.input_ids.shape[1]:]
-            response = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+        return responses
 
-            logger.debug(f"Generated response: {response[:50]}...")
-            return response.strip()
+    def _remember_session(
+            self,
+            session_id: str,
+            sequence: torch.Tensor,
+            legacy_cache: LegacyCache,
+            row: int,
+            prompt_positions: Sequence[int],
+            padded_length: int
+    ) -> None:
+        """
+        Store one row of a generation's cache as the session's reusable prefix.
 
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return f"I'm having trouble processing your request. Please try again later. (Error: {str(e)})"
\ No newline at end of file
+        Args:
+            session_id: The unique identifier for the conversation session
+            sequence: The row's prompt and generated token IDs, including padding
+            legacy_cache: The past key/values returned by generate
+            row: The row of the batch to store
+            prompt_positions: The positions of the row's prompt tokens, without padding
+            padded_length: The padded prompt length, after which generated tokens start
+        """
+        # The cache holds every token except the last one sampled; padding is left out
+        cache_length = legacy_cache[0][0].shape[2]
+        positions = list(prompt_positions) + list(range(padded_length, cache_length))
+        prompt_length = len(prompt_positions)
+        token_ids = sequence[positions].tolist()
+
+        # Tokens after the end of the answer are only padding
+        for position in range(prompt_length, len(token_ids)):
+            if token_ids[position] in (self.tokenizer.pad_token_id, self.tokenizer.eos_token_id):
+                token_ids = token_ids[:position]
+                positions = positions[:position]
+                break
+
+        # Copy the row out so the rest of the batch's cache can be freed
+        row_cache = gather_positions(legacy_cache, row, positions)
+        self.prefix_cache.store(session_id, token_ids, row_cache)
+
+    def forget_session(self, session_id: str) -> None:
+        """
+        Drop any cached state for a session.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+        """
+        self.prefix_cache.discard(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get generation statistics.
+
+        Returns:
+            A dictionary of model runtime statistics
+        """
+        return {
+            "precision": self.precision,
+            "batching": self.scheduler.stats(),
+            "prefix_cache": self.prefix_cache.stats(),
+            "system_prefix": {
+                "tokens": len(self.system_prefix_ids),
+                "generations": self._system_prefix_hits
+            }
+        }
\ No newline at end of file
@@ -0,0 +1,252 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import torch
+from transformers import DynamicCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Past key/values in the legacy layout: one (key, value) tensor pair per layer,
+# each shaped [batch, heads, sequence, head_dim]
+LegacyCache = Tuple[Tuple[Any, Any], ...]
+
+
+def to_legacy_cache(past_key_values: Any) -> LegacyCache:
+    """Convert a transformers cache object to the legacy tuple layout."""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+def to_dynamic_cache(legacy_cache: LegacyCache) -> DynamicCache:
+    """
+    Wrap legacy past key/values in a cache object that generate() can extend.
+
+    DynamicCache grows by concatenation, so the wrapped tensors are never modified
+    and a cached prefix can be shared by many generations without copying.
+    """
+    return DynamicCache.from_legacy_cache(legacy_cache)
+
+
+def slice_cache(legacy_cache: LegacyCache, row: int = 0, start: int = 0, end: Optional[int] = None) -> LegacyCache:
+    """
+    Take one batch row and a range of positions out of a cache.
+
+    Args:
+        legacy_cache: The cache to slice
+        row: The batch row to keep
+        start: The first position to keep
+        end: The position to stop at (exclusive), or None for the end
+
+    Returns:
+        A single-row cache made of views into the original tensors
+    """
+    return tuple(
+        (key[row:row + 1, :, start:end, :], value[row:row + 1, :, start:end, :])
+        for key, value in legacy_cache
+    )
+
+
+def gather_positions(legacy_cache: LegacyCache, row: int, positions: Sequence[int]) -> LegacyCache:
+    """
+    Copy selected positions of one batch row out of a cache.
+
+    Args:
+        legacy_cache: The cache to copy from
+        row: The batch row to keep
+        positions: The sequence positions to keep, in order
+
+    Returns:
+        A single-row cache that no longer references the original tensors
+    """
+    index = torch.tensor(positions, dtype=torch.long, device=legacy_cache[0][0].device)
+    return tuple(
+        (key[row:row + 1].index_select(2, index), value[row:row + 1].index_select(2, index))
+        for key, value in legacy_cache
+    )
+
+
+def expand_cache(legacy_cache: LegacyCache, batch_size: int) -> LegacyCache:
+    """
+    Repeat a single-row cache across a batch without copying it.
+
+    Args:
+        legacy_cache: A cache with a batch size of one
+        batch_size: The batch size to expand to
+
+    Returns:
+        A cache whose rows all view the original tensors
+    """
+    if batch_size == 1:
+        return legacy_cache
+
+    return tuple(
+        (key.expand(batch_size, -1, -1, -1), value.expand(batch_size, -1, -1, -1))
+        for key, value in legacy_cache
+    )
+
+
+def stack_caches(caches: Sequence[LegacyCache], length: int) -> LegacyCache:
+    """
+    Combine single-row caches of different lengths into one batch.
+
+    Each row is left-padded with zeros to the same length, so the attention mask must
+    leave the padded positions out.
+
+    Args:
+        caches: Single-row caches, one per batch row
+        length: The length to pad to, at least that of the longest cache
+
+    Returns:
+        A cache whose rows are copies of the given caches
+    """
+    def stack(tensors):
+        return torch.cat([
+            torch.nn.functional.pad(tensor, (0, 0, length - tensor.shape[2], 0))
+            for tensor in tensors
+        ], dim=0)
+
+    return tuple(
+        (stack([cache[layer][0] for cache in caches]), stack([cache[layer][1] for cache in caches]))
+        for layer in range(len(caches[0]))
+    )
+
+
+def cache_nbytes(legacy_cache: LegacyCache) -> int:
+    """Count the bytes held by the tensors of a cache."""
+    return sum(
+        key.numel() * key.element_size() + value.numel() * value.element_size()
+        for key, value in legacy_cache
+    )
+
+
+def common_prefix_length(first: Sequence[int], second: Sequence[int]) -> int:
+    """Count the leading tokens two sequences share."""
+    length = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+    return length
+
+
+class PrefixKVCache:
+    """
+    An LRU cache of past key/values per conversation session, bounded by a memory budget.
+
+    Each session keeps the cache of its latest prompt (and answer). A new turn reuses
+    the longest token prefix it shares with that entry, so only the appended tokens
+    have to be prefilled.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the prefix cache.
+
+        Args:
+            max_bytes: Memory budget for cached tensors; 0 disables the cache
+        """
+        logger.info(f"Initializing prefix KV cache with a budget of {max_bytes // (1024 * 1024)} MB")
+
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, session_id: str, token_ids: Sequence[int]) -> Tuple[int, Optional[LegacyCache]]:
+        """
+        Find the cached prefix of a session's new prompt.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            token_ids: The token IDs of the new prompt
+
+        Returns:
+            A tuple of (cached_length, cache), or (0, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+
+            if entry is not None:
+                cached_ids, legacy_cache, _ = entry
+
+                # At least one token must be prefilled to get logits for the next token
+                length = min(common_prefix_length(cached_ids, token_ids), len(token_ids) - 1)
+
+                if length > 0:
+                    self._entries.move_to_end(session_id)
+                    self._hits += 1
+                    logger.debug(f"Prefix cache hit for session {session_id}: {length}/{len(token_ids)} tokens")
+                    return length, slice_cache(legacy_cache, end=length)
+
+            self._misses += 1
+            return 0, None
+
+    def store(self, session_id: str, token_ids: Sequence[int], legacy_cache: LegacyCache) -> None:
+        """
+        Remember the cache of a session's latest sequence, evicting old sessions if needed.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            token_ids: The token IDs the cache covers
+            legacy_cache: A single-row cache covering exactly those tokens
+        """
+        nbytes = cache_nbytes(legacy_cache)
+
+        with self._lock:
+            self._remove(session_id)
+
+            if nbytes > self.max_bytes:
+                logger.debug(f"Not caching {nbytes} bytes for session {session_id}, over budget")
+                return
+
+            self._entries[session_id] = (tuple(token_ids), legacy_cache, nbytes)
+            self._bytes += nbytes
+
+            # Evict least recently used sessions until we are back under budget
+            while self._bytes > self.max_bytes:
+                evicted_id, _ = next(iter(self._entries.items()))
+                self._remove(evicted_id)
+                self._evictions += 1
+                logger.debug(f"Evicted prefix cache for session {evicted_id}")
+
+    def discard(self, session_id: str) -> None:
+        """
+        Drop the cache of a session.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+        """
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str) -> None:
+        """Remove an entry and release its bytes; the lock must be held."""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            A dictionary with hit, miss, eviction and memory figures
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions
+            }
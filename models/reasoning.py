@@ -0,0 +1,57 @@
+from typing import Iterable, Iterator
+
+# Marker that closes the model's hidden reasoning block
+THINK_END_MARKER = "</think>"
+
+
+def strip_reasoning(text: str, marker: str = THINK_END_MARKER) -> str:
+    """
+    Drop the reasoning block from a complete response.
+
+    Args:
+        text: The decoded response
+        marker: The marker that ends the reasoning block
+
+    Returns:
+        The answer after the marker; if the marker never appears, the whole text
+    """
+    return text.split(marker)[-1].strip()
+
+
+def suppress_reasoning(chunks: Iterable[str], marker: str = THINK_END_MARKER) -> Iterator[str]:
+    """
+    Hold back streamed text until the reasoning block has closed.
+
+    Args:
+        chunks: Text chunks in generation order
+        marker: The marker that ends the reasoning block
+
+    Returns:
+        An iterator over the answer text only; if the marker never appears,
+        the whole text is emitted at the end
+    """
+    buffer = ""
+    answering = False
+    started = False
+
+    for chunk in chunks:
+        if not answering:
+            buffer += chunk
+
+            # Only the newly appended text can complete the marker
+            if marker not in buffer[-(len(chunk) + len(marker)):]:
+                continue
+
+            answering = True
+            chunk = buffer.split(marker)[-1]
+
+        # Drop the blank lines between the reasoning block and the answer
+        if not started:
+            chunk = chunk.lstrip()
+            started = bool(chunk)
+
+        if chunk:
+            yield chunk
+
+    if not answering and buffer:
+        yield buffer
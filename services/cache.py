@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache with hit/miss counters.
+
+    Entries can optionally expire after a TTL, and the cache can be bounded by an
+    approximate byte budget as well as by its number of entries.
+    """
+
+    def __init__(
+            self,
+            max_entries: int,
+            ttl_seconds: float = 0,
+            max_bytes: int = 0,
+            size_of: Optional[Callable[[Hashable, Any], int]] = None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: The maximum number of entries to keep; 0 disables the cache
+            ttl_seconds: Seconds after which an entry expires (0 keeps entries until evicted)
+            max_bytes: Approximate memory budget for all entries (0 for no budget)
+            size_of: Function estimating the bytes of a key and value, required with max_bytes
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+
+        # key -> (value, expires_at, nbytes)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value and mark it as recently used.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[1] and entry[1] <= time.monotonic():
+                self._remove(key)
+                self._expired += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key: The cache key
+            value: The value to store
+        """
+        if self.max_entries <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+        nbytes = self.size_of(key, value) if self.max_bytes > 0 else 0
+
+        # An entry larger than the whole budget would only evict everything else
+        if self.max_bytes > 0 and nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at, nbytes)
+            self._bytes += nbytes
+
+            while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        """Drop an entry and its bytes. The lock must be held."""
+        _, _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            A dictionary with size, hit, miss, eviction and expiry counts
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions
+            }
+
+            if self.ttl_seconds > 0:
+                stats["expired"] = self._expired
+            if self.max_bytes > 0:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+
+            return stats
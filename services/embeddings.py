@@ -0,0 +1,190 @@
+import logging
+import os
+from typing import List
+
+import numpy as np
+
+from services.faq_index import normalize_vectors
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "torch" runs the sentence-transformers model eagerly through LangChain; the ONNX backends
+# run an exported copy with ONNX Runtime, optionally with dynamically quantized int8 weights
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# all-MiniLM-L6-v2 is trained on sequences of up to 256 tokens
+MAX_SEQUENCE_LENGTH = 256
+
+
+def embedding_id(model_name: str, backend: str) -> str:
+    """
+    Name the embedding space of a model and backend.
+
+    Saved FAQ embeddings are keyed by this name, so switching backends re-embeds the FAQs
+    instead of mixing vectors from two runtimes in one index.
+
+    Args:
+        model_name: The embedding model name
+        backend: One of EMBEDDING_BACKENDS
+
+    Returns:
+        The model name for the default backend, otherwise the model name and backend
+    """
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def create_embeddings(model_name: str, backend: str, export_dir: str):
+    """
+    Load the embedding model with the selected backend.
+
+    Args:
+        model_name: The embedding model name
+        backend: One of EMBEDDING_BACKENDS
+        export_dir: Where exported ONNX models are kept
+
+    Returns:
+        An object with LangChain's embed_query and embed_documents methods
+    """
+    if backend == "torch":
+        from langchain.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return ONNXEmbeddings(model_name, export_dir, quantize=backend == "onnx-int8")
+
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+
+
+def export_onnx_model(model_name: str, export_dir: str, quantize: bool) -> str:
+    """
+    Export the embedding model's transformer to ONNX once, and quantize it to int8 if asked.
+
+    Args:
+        model_name: The embedding model name
+        export_dir: Where exported models are kept
+        quantize: Whether to return the dynamically quantized int8 model
+
+    Returns:
+        The path of the ONNX model to load
+    """
+    directory = os.path.join(export_dir, model_name.replace("/", "--"))
+    fp32_path = os.path.join(directory, "model.onnx")
+    int8_path = os.path.join(directory, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {model_name} to ONNX at {fp32_path}")
+        os.makedirs(directory, exist_ok=True)
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name, return_dict=False).eval()
+        sample = tokenizer(["How do I track my order?"], return_tensors="pt")
+        input_names = list(sample.keys())
+
+        # Batch size and sequence length stay dynamic; write through a temporary name
+        temp_path = f"{fp32_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                temp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                    "last_hidden_state": {0: "batch", 1: "sequence"}
+                },
+                opset_version=14
+            )
+        os.replace(temp_path, fp32_path)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        temp_path = f"{int8_path}.tmp"
+        quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QInt8)
+        os.replace(temp_path, int8_path)
+
+    return int8_path if quantize else fp32_path
+
+
+class ONNXEmbeddings:
+    """
+    Sentence embeddings from an ONNX Runtime session over the exported transformer.
+
+    Reproduces the sentence-transformers pipeline of the model: token embeddings are
+    mean-pooled over the attention mask and scaled to unit length.
+    """
+
+    def __init__(self, model_name: str, export_dir: str, quantize: bool = False):
+        """
+        Initialize the ONNX embedding backend, exporting the model on first use.
+
+        Args:
+            model_name: The embedding model name
+            export_dir: Where exported models are kept
+            quantize: Whether to run the dynamically quantized int8 model
+        """
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnx embedding backends require the 'onnxruntime' package (pip install onnxruntime)")
+
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.path = export_onnx_model(model_name, export_dir, quantize)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+        logger.info(f"Loaded ONNX embedding model from {self.path}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts in one forward pass.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            One unit-length embedding per text
+        """
+        if not texts:
+            return []
+
+        encoded = self.tokenizer(
+            [text.replace("\n", " ") for text in texts],
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQUENCE_LENGTH,
+            return_tensors="np"
+        )
+        hidden = self.session.run(
+            ["last_hidden_state"],
+            {name: encoded[name].astype("int64") for name in self.input_names}
+        )[0]
+
+        # Mean-pool the token embeddings, ignoring padding
+        mask = encoded["attention_mask"][..., None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        return normalize_vectors(pooled).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed one text.
+
+        Args:
+            text: The text to embed
+
+        Returns:
+            The unit-length embedding
+        """
+        return self.embed_documents([text])[0]
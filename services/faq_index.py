@@ -0,0 +1,322 @@
+import hashlib
+import json
+import logging
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import faiss
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.faiss"
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# IVF needs roughly this many training points per list for stable centroids
+MIN_POINTS_PER_LIST = 39
+
+
+class IndexSettings(NamedTuple):
+    """How the FAQ index is built and searched."""
+    index_type: str = "flat"
+    ivf_nlist: int = 0
+    ivf_nprobe: int = 8
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 80
+    hnsw_ef_search: int = 64
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scale vectors to unit length so inner product equals cosine similarity.
+
+    Args:
+        vectors: Vectors, one per row
+
+    Returns:
+        A normalized float32 copy
+    """
+    vectors = np.array(vectors, dtype="float32", copy=True)
+    if len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def faq_hash(faq: Dict, model_name: str) -> str:
+    """
+    Hash the part of an FAQ that determines its embedding.
+
+    Only the question is embedded, so editing an answer never forces a re-embed.
+
+    Args:
+        faq: The FAQ entry
+        model_name: The embedding model name
+
+    Returns:
+        A hex digest identifying the entry's embedding
+    """
+    return hashlib.sha256(f"{model_name}\n{faq['question']}".encode("utf-8")).hexdigest()
+
+
+class FAQIndex:
+    """
+    An immutable snapshot of the FAQ entries and the vector index built over their questions.
+
+    Readers take a reference to the current snapshot once per query, so a reload can swap
+    in a new snapshot without disturbing queries that are already running.
+    """
+
+    def __init__(self, faqs: List[Dict], index: faiss.Index):
+        self.faqs = faqs
+        self.index = index
+
+    def search(self, vectors: np.ndarray, top_k: int) -> List[List[Dict]]:
+        """
+        Find the nearest FAQ questions for a batch of query vectors.
+
+        Args:
+            vectors: Float32 query vectors, one per row
+            top_k: The number of neighbours to return per query
+
+        Returns:
+            For each query, a list of {"question", "answer", "score"} dictionaries,
+            where score is the cosine similarity (1.0 is a perfect match)
+        """
+        k = min(top_k, self.index.ntotal)
+        if k == 0:
+            return [[] for _ in range(len(vectors))]
+
+        scores, ids = self.index.search(normalize_vectors(vectors), k)
+
+        return [
+            [
+                {"question": self.faqs[i]["question"], "answer": self.faqs[i]["answer"], "score": float(score)}
+                for score, i in zip(row_scores, row_ids)
+                if i >= 0
+            ]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+
+def ivf_list_count(settings: IndexSettings, count: int) -> int:
+    """
+    Choose the number of IVF lists for a corpus.
+
+    Args:
+        settings: The index settings; ivf_nlist of 0 picks 4 * sqrt(count)
+        count: The number of vectors to index
+
+    Returns:
+        The number of lists, capped so every list has enough training points
+    """
+    nlist = settings.ivf_nlist or int(4 * math.sqrt(count))
+    return max(1, min(nlist, count // MIN_POINTS_PER_LIST))
+
+
+def _build_params(settings: IndexSettings, count: int) -> Dict:
+    """The settings that shape the stored index; changing any of them forces a rebuild."""
+    if settings.index_type == "ivf":
+        return {"index_type": "ivf", "nlist": ivf_list_count(settings, count)}
+    if settings.index_type == "hnsw":
+        return {"index_type": "hnsw", "m": settings.hnsw_m, "ef_construction": settings.hnsw_ef_construction}
+    return {"index_type": "flat"}
+
+
+def build_index(vectors: np.ndarray, settings: IndexSettings) -> faiss.Index:
+    """
+    Build an inner-product index over normalized vectors.
+
+    Args:
+        vectors: Unit-length float32 vectors, one per row
+        settings: The index settings
+
+    Returns:
+        The trained and populated index
+    """
+    dimension = vectors.shape[1]
+    params = _build_params(settings, len(vectors))
+
+    if params["index_type"] == "ivf" and len(vectors) > 0:
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        logger.info(f"Training IVF index with {params['nlist']} lists on {len(vectors)} vectors")
+        index.train(vectors)
+    elif params["index_type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        index = faiss.IndexFlatIP(dimension)
+
+    index.add(vectors)
+    return index
+
+
+def tune_index(index: faiss.Index, settings: IndexSettings) -> faiss.Index:
+    """
+    Apply the search-time parameters, which are not part of the stored index.
+
+    Args:
+        index: An index from build_index or read from disk
+        settings: The index settings; ivf_nprobe and hnsw_ef_search are used
+
+    Returns:
+        The same index, tuned in place
+    """
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(settings.ivf_nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.hnsw_ef_search
+    return index
+
+
+def _read_manifest(index_dir: str) -> Optional[Dict]:
+    """Read the manifest of a persisted index, or None if there is none."""
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_atomically(path: str, write) -> None:
+    """
+    Write a file through a temporary name so readers never see a partial file.
+
+    Args:
+        path: The file to write
+        write: A callable that writes the complete file to the path it is given
+    """
+    temp_path = f"{path}.tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+def _save(
+        index_dir: str,
+        model_name: str,
+        hashes: List[str],
+        vectors: np.ndarray,
+        index: faiss.Index,
+        build_params: Dict
+) -> None:
+    """Persist the embeddings, the index and the manifest describing them."""
+    os.makedirs(index_dir, exist_ok=True)
+
+    def write_embeddings(path):
+        with open(path, 'wb') as f:
+            np.save(f, vectors)
+
+    def write_manifest(path):
+        with open(path, 'w') as f:
+            json.dump({
+                "embedding_model": model_name,
+                "dimension": int(vectors.shape[1]),
+                "index": build_params,
+                "hashes": hashes
+            }, f)
+
+    write_atomically(os.path.join(index_dir, EMBEDDINGS_FILE), write_embeddings)
+    write_atomically(os.path.join(index_dir, INDEX_FILE), lambda path: faiss.write_index(index, path))
+
+    # The manifest goes last: it only describes files that are already complete
+    write_atomically(os.path.join(index_dir, MANIFEST_FILE), write_manifest)
+
+
+def _read_index(path: str) -> faiss.Index:
+    """Memory-map a persisted index, falling back to a regular read for index types that cannot be mapped."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def load_or_build_index(
+        faqs: List[Dict],
+        embeddings,
+        model_name: str,
+        index_dir: str,
+        settings: IndexSettings = IndexSettings()
+) -> FAQIndex:
+    """
+    Load the persisted FAQ index, re-embedding only the questions that changed.
+
+    Args:
+        faqs: The current FAQ entries
+        embeddings: The embedding model (anything with embed_documents)
+        model_name: The embedding model name, part of every entry's hash
+        index_dir: Directory holding the persisted index
+        settings: How the index is built and searched
+
+    Returns:
+        A snapshot of the FAQs and their index
+    """
+    if settings.index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAQ index type {settings.index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+    hashes = [faq_hash(faq, model_name) for faq in faqs]
+    build_params = _build_params(settings, len(faqs))
+
+    try:
+        manifest = _read_manifest(index_dir)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable FAQ index manifest: {str(e)}")
+        manifest = None
+
+    # Nothing changed: map the saved index straight from disk
+    if (
+            manifest
+            and manifest.get("embedding_model") == model_name
+            and manifest.get("index") == build_params
+            and manifest.get("hashes") == hashes
+    ):
+        try:
+            index = tune_index(_read_index(os.path.join(index_dir, INDEX_FILE)), settings)
+            logger.info(f"Loaded persisted {build_params['index_type']} FAQ index with {index.ntotal} entries")
+            return FAQIndex(faqs, index)
+        except Exception as e:
+            logger.warning(f"Could not load persisted FAQ index, rebuilding: {str(e)}")
+
+    # Reuse saved embeddings for unchanged questions
+    saved_rows = {}
+    saved_vectors = None
+    if manifest and manifest.get("embedding_model") == model_name:
+        try:
+            saved_vectors = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+            saved_rows = {h: row for row, h in enumerate(manifest.get("hashes", []))}
+        except Exception as e:
+            logger.warning(f"Could not load persisted FAQ embeddings: {str(e)}")
+
+    missing = [position for position, h in enumerate(hashes) if h not in saved_rows]
+    logger.info(f"Embedding {len(missing)} new or changed FAQ questions, reusing {len(faqs) - len(missing)}")
+
+    new_vectors = {}
+    if missing:
+        embedded = embeddings.embed_documents([faqs[position]["question"] for position in missing])
+        new_vectors = dict(zip(missing, np.asarray(embedded, dtype="float32")))
+
+    if hashes:
+        vectors = normalize_vectors(np.stack([
+            new_vectors[position] if position in new_vectors else np.array(saved_vectors[saved_rows[h]])
+            for position, h in enumerate(hashes)
+        ]))
+    else:
+        dimension = len(embeddings.embed_query("dimension probe"))
+        vectors = np.zeros((0, dimension), dtype="float32")
+
+    # Release the mapped file before it is replaced
+    saved_vectors = None
+
+    index = tune_index(build_index(vectors, settings), settings)
+
+    try:
+        _save(index_dir, model_name, hashes, vectors, index, build_params)
+    except Exception as e:
+        logger.warning(f"Could not persist FAQ index: {str(e)}")
+
+    return FAQIndex(faqs, index)
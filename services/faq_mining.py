@@ -0,0 +1,246 @@
+"""
+Mine the turn log for questions the language model keeps answering, and propose them as FAQs.
+
+Usage:
+    python -m services.faq_mining --log data/model_turns.ndjson --output data/faq_candidates.json
+
+Only first turns are mined: answers to follow-up questions depend on the conversation before
+them, so they cannot be reused as FAQ answers.
+
+Logged questions are grouped by their normalized text, the distinct questions are embedded in
+batches, and spherical k-means groups questions that mean the same thing. Clusters that were
+asked at least --min-count times and are not already covered by an FAQ become candidates,
+ranked by how often they were asked. Each candidate's question is its most asked phrasing
+and its answer is the model answer given most often to that phrasing.
+
+The output uses the data/faqs.json format, so reviewed entries can be copied over as they are.
+The extra "asked" and "variants" keys help the review and are ignored by the FAQ loader.
+"""
+import argparse
+import json
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import faiss
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_EXPORT_DIR, FAQ_CANDIDATES_PATH, FAQ_MATCH_THRESHOLD, FAQ_PATH,
+    TURN_LOG_PATH
+)
+from models.reasoning import strip_reasoning
+from services.embeddings import create_embeddings
+from services.faq_index import normalize_vectors, write_atomically
+from services.faq_retrieval import normalize_query
+from services.turn_log import read_turns
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Distinct answers remembered per question; sampled answers rarely repeat exactly
+MAX_ANSWERS_PER_QUESTION = 5
+
+
+def aggregate_turns(turns: Iterable[Dict]) -> List[Dict]:
+    """
+    Group logged turns by normalized question, so each distinct question is embedded once.
+
+    Turns that were answered with conversation history are skipped, and answers are reduced
+    to the text after the reasoning block, which logs written by older versions still contain.
+
+    Args:
+        turns: Logged {"question", "answer", "history"} turns
+
+    Returns:
+        One {"question", "count", "answers"} entry per distinct question, where answers
+        counts up to MAX_ANSWERS_PER_QUESTION distinct answers
+    """
+    questions = {}
+
+    for turn in turns:
+        if turn.get("history"):
+            continue
+
+        key = normalize_query(turn["question"])
+        answer = strip_reasoning(turn["answer"])
+        if not key or not answer:
+            continue
+
+        entry = questions.get(key)
+        if entry is None:
+            entry = questions[key] = {"question": turn["question"].strip(), "count": 0, "answers": Counter()}
+
+        entry["count"] += 1
+        answers = entry["answers"]
+        if answer in answers or len(answers) < MAX_ANSWERS_PER_QUESTION:
+            answers[answer] += 1
+
+    return list(questions.values())
+
+
+def embed_questions(embeddings, questions: List[str], batch_size: int) -> np.ndarray:
+    """
+    Embed questions in batches.
+
+    Args:
+        embeddings: The embedding model
+        questions: The questions to embed
+        batch_size: Questions embedded per call
+
+    Returns:
+        Unit-length float32 embeddings, one row per question
+    """
+    vectors = []
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+        vectors.append(normalize_vectors(np.asarray(embeddings.embed_documents(batch), dtype="float32")))
+
+        if (start // batch_size) % 100 == 0:
+            logger.info(f"Embedded {start + len(batch)} of {len(questions)} questions")
+
+    return np.vstack(vectors)
+
+
+def cluster_questions(vectors: np.ndarray, clusters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group question embeddings with spherical k-means.
+
+    Args:
+        vectors: Unit-length question embeddings
+        clusters: The number of clusters
+        seed: Random seed for k-means
+
+    Returns:
+        A tuple of (assignment, similarity): each question's cluster and its cosine similarity to the cluster centroid
+    """
+    # Training samples at most 256 points per centroid, so it stays fast on millions of questions
+    kmeans = faiss.Kmeans(vectors.shape[1], clusters, niter=20, spherical=True, seed=seed)
+    kmeans.train(vectors)
+
+    similarity, assignment = kmeans.index.search(vectors, 1)
+    return assignment[:, 0], similarity[:, 0]
+
+
+def build_candidates(
+        entries: List[Dict],
+        assignment: np.ndarray,
+        similarity: np.ndarray,
+        min_similarity: float,
+        min_count: int
+) -> List[Dict]:
+    """
+    Turn clusters of questions into ranked FAQ candidates.
+
+    Args:
+        entries: The distinct questions, as returned by aggregate_turns
+        assignment: Each question's cluster
+        similarity: Each question's similarity to its cluster centroid
+        min_similarity: Questions less similar than this to their centroid are left out of the cluster
+        min_count: Clusters asked fewer times than this are dropped
+
+    Returns:
+        Candidates ordered by how often they were asked
+    """
+    members = {}
+    for i, (cluster, score) in enumerate(zip(assignment, similarity)):
+        if score >= min_similarity:
+            members.setdefault(int(cluster), []).append(i)
+
+    candidates = []
+    for indexes in members.values():
+        asked = sum(entries[i]["count"] for i in indexes)
+        if asked < min_count:
+            continue
+
+        # The most asked phrasing represents the cluster; closeness to the centroid breaks ties
+        indexes.sort(key=lambda i: (entries[i]["count"], similarity[i]), reverse=True)
+        representative = entries[indexes[0]]
+
+        candidates.append({
+            "question": representative["question"],
+            "answer": representative["answers"].most_common(1)[0][0],
+            "asked": asked,
+            "variants": [entries[i]["question"] for i in indexes[1:6]]
+        })
+
+    candidates.sort(key=lambda candidate: candidate["asked"], reverse=True)
+    return candidates
+
+
+def drop_covered(
+        candidates: List[Dict],
+        candidate_vectors: np.ndarray,
+        faq_vectors: np.ndarray,
+        threshold: float
+) -> List[Dict]:
+    """Drop candidates that an existing FAQ already answers."""
+    if not len(candidates) or not len(faq_vectors):
+        return candidates
+
+    index = faiss.IndexFlatIP(faq_vectors.shape[1])
+    index.add(faq_vectors)
+    scores, _ = index.search(candidate_vectors, 1)
+
+    return [candidate for candidate, score in zip(candidates, scores[:, 0]) if score < threshold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=TURN_LOG_PATH, help="The NDJSON turn log to mine")
+    parser.add_argument("--output", default=FAQ_CANDIDATES_PATH)
+    parser.add_argument("--faqs", default=FAQ_PATH, help="Existing FAQs; candidates they already answer are dropped")
+    parser.add_argument("--clusters", type=int, default=0, help="k-means clusters; 0 picks 4 * sqrt(distinct questions)")
+    parser.add_argument("--min-similarity", type=float, default=FAQ_MATCH_THRESHOLD,
+                        help="Cosine similarity to the centroid a question needs to count towards its cluster")
+    parser.add_argument("--min-count", type=int, default=5, help="Times a cluster must have been asked")
+    parser.add_argument("--batch-size", type=int, default=512, help="Questions embedded per batch")
+    parser.add_argument("--limit", type=int, default=100, help="Candidates to write")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    if not args.log:
+        parser.error("no turn log given; pass --log or set TURN_LOG_PATH")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    entries = aggregate_turns(read_turns(args.log))
+    logger.info(f"Read {sum(entry['count'] for entry in entries)} turns with {len(entries)} distinct questions")
+    if not entries:
+        return
+
+    embeddings = create_embeddings(EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_EXPORT_DIR)
+    vectors = embed_questions(embeddings, [entry["question"] for entry in entries], args.batch_size)
+
+    # k-means needs a few points per cluster
+    clusters = args.clusters or int(4 * math.sqrt(len(entries)))
+    clusters = max(1, min(clusters, len(entries) // 4 or 1))
+    logger.info(f"Clustering {len(entries)} questions into {clusters} clusters")
+    assignment, similarity = cluster_questions(vectors, clusters, args.seed)
+
+    candidates = build_candidates(entries, assignment, similarity, args.min_similarity, args.min_count)
+
+    # Questions already answered by an FAQ need no new entry
+    with open(args.faqs, 'r') as f:
+        faq_questions = [faq["question"] for faq in json.load(f)]
+    if candidates and faq_questions:
+        candidates = drop_covered(
+            candidates,
+            embed_questions(embeddings, [candidate["question"] for candidate in candidates], args.batch_size),
+            embed_questions(embeddings, faq_questions, args.batch_size),
+            FAQ_MATCH_THRESHOLD
+        )
+
+    candidates = candidates[:args.limit]
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(candidates, f, indent=2)
+
+    write_atomically(args.output, write)
+    logger.info(f"Wrote {len(candidates)} FAQ candidates to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
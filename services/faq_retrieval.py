@@ -1,19 +1,32 @@
 import json
 import logging
 import os
+import threading
+import time
 import numpy as np
 from typing import List, Dict, Tuple, Optional
 
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.schema import Document
-
-from config import FAQ_PATH, EMBEDDING_MODEL
+from config import (
+    FAQ_PATH, FAQ_INDEX_DIR, FAQ_WATCH_INTERVAL, EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_EXPORT_DIR,
+    FAQ_CACHE_SIZE, FAQ_MATCH_THRESHOLD, FAQ_INDEX_TYPE, FAQ_IVF_NLIST, FAQ_IVF_NPROBE, FAQ_HNSW_M, FAQ_HNSW_EF_CONSTRUCTION, FAQ_HNSW_EF_SEARCH,
+    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, RESPONSE_CACHE_TTL_SECONDS, FAQ_BATCH_MAX_SIZE,
+    FAQ_BATCH_MAX_WAIT_MS
+)
+from models.batching import BatchScheduler
+from services.cache import LRUCache
+from services.embeddings import create_embeddings, embedding_id
+from services.faq_index import FAQIndex, IndexSettings, load_or_build_index
+from services.semantic_cache import SemanticCache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different phrasings share cache entries."""
+    return " ".join(query.lower().split()).strip("?!. ")
+
+
 class FAQRetrieval:
     """
     A service for retrieving FAQs based on vector similarity search.
@@ -25,20 +38,58 @@ class FAQRetrieval:
 
         try:
             # Load the embedding model
-            self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-            logger.debug(f"Loaded embedding model: {EMBEDDING_MODEL}")
+            self.embeddings = create_embeddings(EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_EXPORT_DIR)
+            self.embedding_id = embedding_id(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+            logger.debug(f"Loaded embedding model: {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})")
+
+            # Repeated questions skip the embedding model and the index search
+            self.embedding_cache = LRUCache(FAQ_CACHE_SIZE)
+            self.result_cache = LRUCache(FAQ_CACHE_SIZE)
+            # Bumped by every reload; cached results are keyed by the snapshot they came from
+            self._generation = 0
+
+            # Concurrent queries share one embedding forward pass and one index search
+            self.query_batcher = None
+            if FAQ_BATCH_MAX_SIZE > 1:
+                self.query_batcher = BatchScheduler(
+                    run_batch=self._search_batch,
+                    max_batch_size=FAQ_BATCH_MAX_SIZE,
+                    max_wait_ms=FAQ_BATCH_MAX_WAIT_MS,
+                    name="faq-query-batcher"
+                )
+
+            # Model answers to earlier questions, searched in the same embedding space as the FAQs
+            self.answer_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, RESPONSE_CACHE_TTL_SECONDS)
+
+            self.index_settings = IndexSettings(
+                index_type=FAQ_INDEX_TYPE,
+                ivf_nlist=FAQ_IVF_NLIST,
+                ivf_nprobe=FAQ_IVF_NPROBE,
+                hnsw_m=FAQ_HNSW_M,
+                hnsw_ef_construction=FAQ_HNSW_EF_CONSTRUCTION,
+                hnsw_ef_search=FAQ_HNSW_EF_SEARCH
+            )
 
-            # Create or load the FAQ data
-            self.create_or_load_faq_data()
+            # Create or load the FAQ data and its vector index
+            self._reload_lock = threading.Lock()
+            self.store = self.initialize_vector_store(self.create_or_load_faq_data())
+            self._faq_mtime = self._current_mtime()
 
-            # Initialize the vector store
-            self.initialize_vector_store()
+            # Optionally pick up edits to the FAQ file without a restart
+            if FAQ_WATCH_INTERVAL > 0:
+                self._watcher = threading.Thread(target=self._watch_faq_file, name="faq-watcher", daemon=True)
+                self._watcher.start()
 
         except Exception as e:
             logger.error(f"Error initializing FAQ retrieval service: {str(e)}")
             raise RuntimeError(f"Failed to initialize FAQ retrieval service: {str(e)}")
 
-    def create_or_load_faq_data(self):
+    @property
+    def faqs(self) -> List[Dict]:
+        """The FAQ entries of the current index snapshot."""
+        return self.store.faqs
+
+    def create_or_load_faq_data(self) -> List[Dict]:
         """Create FAQ data file if it doesn't exist, or load existing data."""
         try:
             if not os.path.exists(FAQ_PATH):
@@ -85,45 +136,105 @@ class FAQRetrieval:
                 with open(FAQ_PATH, 'w') as f:
                     json.dump(default_faqs, f, indent=2)
 
-                self.faqs = default_faqs
+                return default_faqs
             else:
                 # Load existing FAQs
                 logger.debug(f"Loading existing FAQ data from {FAQ_PATH}")
                 with open(FAQ_PATH, 'r') as f:
-                    self.faqs = json.load(f)
+                    faqs = json.load(f)
 
-                logger.info(f"Loaded {len(self.faqs)} FAQs")
+                logger.info(f"Loaded {len(faqs)} FAQs")
+                return faqs
 
         except Exception as e:
             logger.error(f"Error creating or loading FAQ data: {str(e)}")
             raise RuntimeError(f"Failed to create or load FAQ data: {str(e)}")
 
-    def initialize_vector_store(self):
-        """Initialize the FAISS vector store with FAQ data."""
-        try:
-            logger.debug("Initializing FAISS vector store")
+    def initialize_vector_store(self, faqs: List[Dict]) -> FAQIndex:
+        """
+        Load the persisted FAISS index for the FAQs, embedding only new or changed questions.
 
-            # Convert FAQs to documents for the vector store
-            documents = []
-            metadatas = []
+        Args:
+            faqs: The FAQ entries to index
 
-            for i, faq in enumerate(self.faqs):
-                documents.append(faq["question"])
-                metadatas.append({"index": i, "question": faq["question"], "answer": faq["answer"]})
+        Returns:
+            A snapshot of the FAQs and their index
+        """
+        try:
+            logger.debug("Initializing FAISS vector store")
 
-            # Create the vector store
-            self.vector_store = FAISS.from_texts(
-                texts=documents,
-                embedding=self.embeddings,
-                metadatas=metadatas
-            )
+            store = load_or_build_index(faqs, self.embeddings, self.embedding_id, FAQ_INDEX_DIR, self.index_settings)
 
-            logger.info(f"Initialized vector store with {len(documents)} FAQ documents")
+            logger.info(f"Initialized vector store with {len(faqs)} FAQ documents")
+            return store
 
         except Exception as e:
             logger.error(f"Error initializing vector store: {str(e)}")
             raise RuntimeError(f"Failed to initialize vector store: {str(e)}")
 
+    def reload(self) -> int:
+        """
+        Reload the FAQ file and atomically swap in an updated index.
+
+        Queries that are already running keep using the previous snapshot.
+
+        Returns:
+            The number of FAQs in the new index
+        """
+        with self._reload_lock:
+            logger.info("Reloading FAQ data")
+
+            mtime = self._current_mtime()
+            store = self.initialize_vector_store(self.create_or_load_faq_data())
+
+            # One reference assignment publishes the new FAQs and index together
+            self.store = store
+            self._faq_mtime = mtime
+
+            # Results of queries still running on the old snapshot land under the old generation,
+            # where no later lookup finds them
+            self._generation += 1
+            self.result_cache.clear()
+
+            logger.info(f"Reloaded {len(store.faqs)} FAQs")
+            return len(store.faqs)
+
+    def _current_mtime(self) -> Optional[float]:
+        """Get the modification time of the FAQ file, or None if it is missing."""
+        try:
+            return os.path.getmtime(FAQ_PATH)
+        except OSError:
+            return None
+
+    def _watch_faq_file(self) -> None:
+        """Poll the FAQ file and reload when it changes."""
+        while True:
+            time.sleep(FAQ_WATCH_INTERVAL)
+            try:
+                if self._current_mtime() != self._faq_mtime:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"Error reloading FAQ data: {str(e)}")
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query, reusing the embedding of an identical normalized query.
+
+        Args:
+            query: The user's question or query
+
+        Returns:
+            The query embedding
+        """
+        key = normalize_query(query)
+
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(key)
+            self.embedding_cache.put(key, embedding)
+
+        return embedding
+
     def retrieve_relevant_faqs(self, query: str, top_k: int = 3) -> List[Dict]:
         """
         Retrieve the most relevant FAQs for a given query.
@@ -138,29 +249,68 @@ class FAQRetrieval:
         try:
             logger.debug(f"Retrieving FAQs for query: {query}")
 
-            # Search for similar questions
-            results = self.vector_store.similarity_search_with_score(query, k=top_k)
+            # Serve repeated questions from the cache
+            cache_key = (self._generation, normalize_query(query), top_k)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Using cached FAQ results")
+                return [dict(faq) for faq in cached]
+
+            # Search for similar questions, together with any concurrent queries
+            item = (cache_key[1], top_k)
+            if self.query_batcher:
+                results = self.query_batcher.submit(item)
+            else:
+                results = self._search_batch([item])[0]
 
             # Extract and format results
             relevant_faqs = []
-            for doc, score in results:
-                # Convert the score to a similarity percentage (FAISS returns L2 distance, smaller is better)
-                # Convert to similarity where 1.0 is perfect match
-                similarity = 1.0 / (1.0 + score)
-
+            for result in results:
+                # The index scores by cosine similarity, where 1.0 is a perfect match
                 relevant_faqs.append({
-                    "question": doc.metadata["question"],
-                    "answer": doc.metadata["answer"],
-                    "similarity": similarity
+                    "question": result["question"],
+                    "answer": result["answer"],
+                    "similarity": result["score"]
                 })
 
+            self.result_cache.put(cache_key, relevant_faqs)
+
             logger.debug(f"Retrieved {len(relevant_faqs)} relevant FAQs")
-            return relevant_faqs
+            return [dict(faq) for faq in relevant_faqs]
 
         except Exception as e:
             logger.error(f"Error retrieving relevant FAQs: {str(e)}")
             return []
 
+    def _search_batch(self, items: List[Tuple[str, int]]) -> List[List[Dict]]:
+        """
+        Embed and search a batch of normalized queries at once.
+
+        Args:
+            items: (normalized_query, top_k) pairs
+
+        Returns:
+            For each item, its top_k {"question", "answer", "score"} results
+        """
+        # Embed the queries that are not cached yet in a single forward pass
+        vectors = {}
+        for query, _ in items:
+            if query not in vectors:
+                vectors[query] = self.embedding_cache.get(query)
+
+        missing = [query for query, vector in vectors.items() if vector is None]
+        if missing:
+            for query, vector in zip(missing, self.embeddings.embed_documents(missing)):
+                vectors[query] = vector
+                self.embedding_cache.put(query, vector)
+
+        # One search serves every query; each caller keeps its own top_k
+        store = self.store
+        matrix = np.asarray([vectors[query] for query, _ in items], dtype="float32")
+        rows = store.search(matrix, max(top_k for _, top_k in items))
+
+        return [row[:top_k] for (_, top_k), row in zip(items, rows)]
+
     def get_all_faqs(self) -> List[Dict]:
         """
         Get all available FAQs.
@@ -170,7 +320,62 @@ class FAQRetrieval:
         """
         return self.faqs
 
-    def is_faq_question(self, query: str, threshold: float = 0.75) -> Tuple[bool, Optional[Dict]]:
+    def get_stats(self) -> Dict:
+        """
+        Get query cache statistics.
+
+        Returns:
+            A dictionary of cache statistics
+        """
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "answer_cache": self.answer_cache.stats(),
+            **({"query_batching": self.query_batcher.stats()} if self.query_batcher else {})
+        }
+
+    def shutdown(self) -> None:
+        """Stop the query batcher after the queued queries have been answered."""
+        if self.query_batcher:
+            self.query_batcher.shutdown()
+
+    def find_cached_answer(self, query: str) -> Optional[str]:
+        """
+        Find a model answer given earlier to a question that means the same as this one.
+
+        The query embedding is usually already cached by the FAQ lookup, so this costs one search.
+
+        Args:
+            query: The user's question or query
+
+        Returns:
+            The cached answer, or None if no earlier question is similar enough
+        """
+        try:
+            if self.answer_cache.max_entries <= 0:
+                return None
+            return self.answer_cache.lookup(self.embed_query(query))
+
+        except Exception as e:
+            logger.error(f"Error looking up cached answers: {str(e)}")
+            return None
+
+    def cache_answer(self, query: str, answer: str) -> None:
+        """
+        Remember a model answer for questions similar to this one.
+
+        Args:
+            query: The user's question or query
+            answer: The model's answer
+        """
+        try:
+            if self.answer_cache.max_entries > 0:
+                self.answer_cache.add(self.embed_query(query), query, answer)
+
+        except Exception as e:
+            logger.error(f"Error caching answer: {str(e)}")
+
+    def is_faq_question(self, query: str, threshold: float = FAQ_MATCH_THRESHOLD) -> Tuple[bool, Optional[Dict]]:
         """
         Determine if a query is closely matching an FAQ question.
 
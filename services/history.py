@@ -0,0 +1,230 @@
+import logging
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from models.reasoning import strip_reasoning
+from services.cache import LRUCache
+from services.memory import SUMMARY_KEY, SUMMARY_THROUGH_KEY
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Chat template tokens added around every message (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Opening of the message that carries the summary of older turns
+SUMMARY_PREFIX = "Summary of our earlier conversation: "
+
+
+class HistoryWindow:
+    """
+    Chooses which conversation messages go into a prompt, newest first, until a token budget is spent.
+
+    Token counts come from the model's tokenizer and are cached per message, so each message
+    is tokenized once however many turns it stays in the window.
+    """
+
+    def __init__(
+            self,
+            count_tokens: Callable[[str], int],
+            token_budget: int,
+            cache_size: int,
+            summary_max_tokens: int = 0
+    ):
+        """
+        Initialize the history window.
+
+        Args:
+            count_tokens: Function returning the number of tokens in a text
+            token_budget: Tokens of history (and summary) allowed in one prompt
+            cache_size: Messages whose token counts are cached
+            summary_max_tokens: The longest summary of older turns, or 0 if turns are not summarized
+        """
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.token_counts = LRUCache(cache_size)
+
+        # Room kept for the summary message once the history no longer fits the budget
+        self.summary_tokens = 0
+        if summary_max_tokens > 0:
+            self.summary_tokens = summary_max_tokens + count_tokens(SUMMARY_PREFIX) + MESSAGE_OVERHEAD_TOKENS
+
+    def message_tokens(self, message: Mapping) -> int:
+        """
+        Count the prompt tokens of one message, using the cache.
+
+        The chat template drops the reasoning block of earlier assistant answers, so only
+        the answer after it is counted.
+        """
+        key = (message["role"], message["content"])
+
+        tokens = self.token_counts.get(key)
+        if tokens is None:
+            content = message["content"]
+            if message["role"] == "assistant":
+                content = strip_reasoning(content)
+            tokens = self.count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            self.token_counts.put(key, tokens)
+
+        return tokens
+
+    def split(self, history: Sequence[Mapping], budget: Optional[int] = None) -> Tuple[List[Mapping], List[Mapping]]:
+        """
+        Split a history into the older messages and the newest messages that fit the budget.
+
+        Args:
+            history: Messages, oldest first
+            budget: Tokens available, or None for the full budget
+
+        Returns:
+            A tuple of (older, window), both oldest first
+        """
+        remaining = self.token_budget if budget is None else budget
+        start = len(history)
+
+        while start > 0:
+            tokens = self.message_tokens(history[start - 1])
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            start -= 1
+
+        return list(history[:start]), list(history[start:])
+
+    def partition(self, history: Sequence[Mapping]) -> Tuple[List[Mapping], List[Mapping]]:
+        """
+        Split a history into the messages to summarize and the window sent with a prompt.
+
+        Once the history no longer fits the budget, the window leaves room for the summary.
+        The summarizer and build() share this cutoff, so every message is either in the
+        window or folded into the summary.
+
+        Args:
+            history: Messages, oldest first
+
+        Returns:
+            A tuple of (older, window), both oldest first
+        """
+        older, window = self.split(history)
+        if older and self.summary_tokens:
+            older, window = self.split(history, self.token_budget - self.summary_tokens)
+        return older, window
+
+    def build(self, history: Sequence[Mapping], summary: Optional[str] = None) -> List[Mapping]:
+        """
+        Build the history sent with a prompt: a summary of older turns, if any, then the newest messages.
+
+        The summary goes in a leading assistant message rather than the system prompt, so the
+        cached system prompt prefix stays valid.
+
+        Args:
+            history: Messages, oldest first, without the message being answered
+            summary: A summary of the messages older than the window, if one exists
+
+        Returns:
+            The messages to send, oldest first
+        """
+        older, window = self.partition(history)
+        if not older:
+            return window
+
+        # Until the first summary is written, the room kept for it holds more messages
+        if not summary:
+            return self.split(history)[1]
+
+        return [{"role": "assistant", "content": f"{SUMMARY_PREFIX}{summary}"}] + window
+
+
+class HistorySummarizer:
+    """
+    Folds the turns that no longer fit the history window into a rolling summary.
+
+    Summaries are written on a background thread after the response has been returned, so
+    they never add latency to a turn. Each session has at most one summary in progress.
+    """
+
+    def __init__(
+            self,
+            summarize: Callable[[Optional[str], List[Mapping]], str],
+            memory,
+            window: HistoryWindow
+    ):
+        """
+        Initialize the summarizer.
+
+        Args:
+            summarize: Function that takes the previous summary and the new messages to fold in
+            memory: The ConversationMemory holding the sessions
+            window: The history window deciding which turns are older
+        """
+        self.summarize = summarize
+        self.memory = memory
+        self.window = window
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summarizer")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._summaries = 0
+
+    def schedule(self, session_id: str) -> None:
+        """
+        Update a session's summary in the background if needed.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+        """
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+
+        self._executor.submit(self._run, session_id)
+
+    def _run(self, session_id: str) -> None:
+        """Summarize the older turns of a session that the current summary does not cover yet."""
+        try:
+            history = self.memory.get_conversation_history(session_id)
+            context = self.memory.get_context(session_id)
+
+            older, _ = self.window.partition(history)
+            if not older:
+                return
+
+            # Only fold in the messages after the last one already summarized, by sequence number
+            through = context.get(SUMMARY_THROUGH_KEY, 0)
+            new_messages = [message for message in older if message.seq > through]
+            if not new_messages:
+                return
+
+            summary = self.summarize(context.get(SUMMARY_KEY), new_messages).strip()
+            if not summary:
+                return
+
+            self.memory.update_context(session_id, {SUMMARY_KEY: summary, SUMMARY_THROUGH_KEY: new_messages[-1].seq})
+
+            with self._lock:
+                self._summaries += 1
+            logger.debug(f"Summarized {len(new_messages)} older messages for session {session_id}")
+
+        except Exception as e:
+            logger.error(f"Error summarizing history for session {session_id}: {str(e)}")
+
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get summarization statistics.
+
+        Returns:
+            A dictionary with the number of summaries written and in progress
+        """
+        with self._lock:
+            return {"summaries": self._summaries, "pending": len(self._pending)}
+
+    def shutdown(self) -> None:
+        """Stop the background thread after the queued summaries have been written."""
+        self._executor.shutdown(wait=True)
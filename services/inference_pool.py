@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+from config import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class InferencePoolFullError(RuntimeError):
+    """Raised when the inference pool cannot admit another request."""
+
+
+class _StreamFailure:
+    """Carries an exception raised by a streaming producer back to the event loop."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class InferencePool:
+    """
+    A bounded worker pool that runs blocking language model calls off the event loop.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_WORKERS, max_queue_size: int = INFERENCE_QUEUE_SIZE):
+        """
+        Initialize the inference pool.
+
+        Args:
+            max_workers: The number of calls allowed to run at the same time
+            max_queue_size: The number of calls allowed to wait for a free worker
+        """
+        logger.info(f"Initializing inference pool with {max_workers} workers and a queue of {max_queue_size}")
+
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+
+        # Every admitted request holds a slot until its call finishes, not just until it is awaited
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = 0
+
+    def _acquire_slot(self) -> None:
+        """Reserve a slot for a new request or raise if the pool is saturated."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning("Inference pool is full, rejecting request")
+            raise InferencePoolFullError("Inference queue is full")
+
+        with self._lock:
+            self._admitted += 1
+
+    def _release_slot(self, _future=None) -> None:
+        """Give back the slot held by a finished request."""
+        with self._lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable on an inference worker.
+
+        Args:
+            func: The callable to run
+            *args: Positional arguments for the callable
+            **kwargs: Keyword arguments for the callable
+
+        Returns:
+            The callable's return value
+
+        Raises:
+            InferencePoolFullError: If all workers are busy and the queue is full
+        """
+        self._acquire_slot()
+
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release_slot()
+            raise
+
+        future.add_done_callback(self._release_slot)
+        return await asyncio.wrap_future(future)
+
+    def stream(self, func: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        """
+        Run a blocking generator on an inference worker and relay its items.
+
+        The slot is reserved immediately, so a full pool is reported before any
+        response has been started. The worker stays busy until the generator is
+        exhausted or the consumer stops reading.
+
+        Args:
+            func: A generator function to run
+            *args: Positional arguments for the generator function
+            **kwargs: Keyword arguments for the generator function
+
+        Returns:
+            An async iterator over the generator's items
+
+        Raises:
+            InferencePoolFullError: If all workers are busy and the queue is full
+        """
+        self._acquire_slot()
+
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        cancelled = threading.Event()
+        finished = object()
+
+        def produce():
+            generator = func(*args, **kwargs)
+            try:
+                for item in generator:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, _StreamFailure(e))
+            finally:
+                generator.close()
+                loop.call_soon_threadsafe(items.put_nowait, finished)
+
+        try:
+            future = self.executor.submit(produce)
+        except Exception:
+            self._release_slot()
+            raise
+
+        future.add_done_callback(self._release_slot)
+
+        async def relay():
+            try:
+                while True:
+                    item = await items.get()
+                    if item is finished:
+                        break
+                    if isinstance(item, _StreamFailure):
+                        raise item.error
+                    yield item
+            finally:
+                cancelled.set()
+
+        return relay()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the current load of the pool.
+
+        Returns:
+            A dictionary with worker, queue and rejection counts
+        """
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "in_flight": self._admitted,
+                "queued": max(0, self._admitted - self.max_workers),
+                "rejected": self._rejected
+            }
+
+    def shutdown(self) -> None:
+        """Stop accepting work and wait for running calls to finish."""
+        logger.info("Shutting down inference pool")
+        self.executor.shutdown(wait=True)
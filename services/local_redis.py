@@ -0,0 +1,200 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Writes between scans for expired keys that are never read again
+PURGE_INTERVAL = 1000
+
+
+class LocalWatchError(Exception):
+    """A watched key changed before the transaction that watched it ran."""
+
+
+def _encode(value: Any) -> bytes:
+    """Store values as bytes, the way Redis returns them."""
+    return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+
+def _list_slice(length: int, start: int, end: int) -> slice:
+    """Turn Redis's inclusive, possibly negative list range into a slice."""
+    if start < 0:
+        start = max(length + start, 0)
+    if end < 0:
+        end = length + end
+    return slice(start, max(end + 1, start))
+
+
+class LocalRedis:
+    """
+    An in-process stand-in for the Redis commands RedisSessionStore uses.
+
+    Selected with SESSION_REDIS_URL = "memory://", it runs the Redis store without a server,
+    for development and for checking the store's behavior. Keys expire like Redis keys, values
+    come back as bytes, and pipelines support WATCH/MULTI transactions. Data lives in this
+    process only, so it is not shared between workers.
+
+    Command methods take the arguments and return the values of their redis-py namesakes.
+    """
+
+    def __init__(self):
+        """Initialize an empty keyspace."""
+        self._data = {}
+        self._expires = {}
+        # Write count per key, so a transaction can tell whether a watched key changed
+        self._versions = {}
+        self._lock = threading.RLock()
+        self._writes = 0
+
+    def _get(self, key: str, default: Any = None) -> Any:
+        """Read a live key, dropping it if it has expired; the lock must be held."""
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._remove(key)
+        return self._data.get(key, default)
+
+    def _remove(self, key: str) -> bool:
+        """Delete a key and its expiry; the lock must be held."""
+        self._expires.pop(key, None)
+        if self._data.pop(key, None) is None:
+            return False
+        self._touch(key)
+        return True
+
+    def _touch(self, key: str) -> None:
+        """Record a write to a key, and now and then drop expired keys; the lock must be held."""
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._writes += 1
+
+        if self._writes % PURGE_INTERVAL == 0:
+            now = time.monotonic()
+            for expired in [k for k, deadline in self._expires.items() if deadline <= now]:
+                self._data.pop(expired, None)
+                del self._expires[expired]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    def incrby(self, key: str, amount: int) -> int:
+        with self._lock:
+            value = int(self._get(key, b"0")) + amount
+            self._data[key] = _encode(value)
+            self._touch(key)
+            return value
+
+    def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                items = self._data[key] = []
+            items.extend(_encode(value) for value in values)
+            self._touch(key)
+            return len(items)
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            items = self._get(key)
+            if items is not None:
+                kept = items[_list_slice(len(items), start, end)]
+                if kept:
+                    self._data[key] = kept
+                    self._touch(key)
+                else:
+                    self._remove(key)
+            return True
+
+    def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            items = self._get(key, [])
+            return list(items[_list_slice(len(items), start, end)])
+
+    def hset(self, key: str, mapping: Dict[str, Any]) -> int:
+        with self._lock:
+            fields = self._get(key)
+            if fields is None:
+                fields = self._data[key] = {}
+            added = 0
+            for field, value in mapping.items():
+                field = _encode(field)
+                added += field not in fields
+                fields[field] = _encode(value)
+            self._touch(key)
+            return added
+
+    def hgetall(self, key: str) -> Dict[bytes, bytes]:
+        with self._lock:
+            return dict(self._get(key, {}))
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._remove(key) for key in keys if self._get(key) is not None)
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    def close(self) -> None:
+        """Nothing to release; present for parity with redis.Redis."""
+
+
+class LocalPipeline:
+    """
+    Queues LocalRedis commands and runs them together under the keyspace lock.
+
+    After watch() and until multi(), commands run immediately, as with redis-py. execute()
+    raises LocalWatchError if a watched key was written in the meantime.
+    """
+
+    def __init__(self, client: LocalRedis):
+        self.client = client
+        self._commands = []
+        self._watched = None
+        self._immediate = False
+
+    def __enter__(self) -> "LocalPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.reset()
+
+    def __getattr__(self, name: str):
+        command = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if self._immediate:
+                return command(*args, **kwargs)
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return call
+
+    def watch(self, *keys: str) -> None:
+        with self.client._lock:
+            self._watched = {key: self.client._versions.get(key, 0) for key in keys}
+        self._immediate = True
+
+    def multi(self) -> None:
+        self._immediate = False
+
+    def execute(self) -> List[Any]:
+        try:
+            with self.client._lock:
+                if self._watched and any(
+                        self.client._versions.get(key, 0) != version for key, version in self._watched.items()
+                ):
+                    raise LocalWatchError("Watched key changed before the transaction ran")
+
+                return [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        finally:
+            self.reset()
+
+    def reset(self) -> None:
+        self._commands = []
+        self._watched = None
+        self._immediate = False
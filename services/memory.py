@@ -1,27 +1,135 @@
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import uuid
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from config import (
+    MAX_SESSIONS, SESSION_TTL_SECONDS, SESSION_MEMORY_MAX_MB, SESSION_SWEEP_INTERVAL, SESSION_STORE,
+    SESSION_DB_PATH, SESSION_REDIS_URL, MAX_HISTORY_MESSAGES
+)
+from services.session_store import InMemorySessionStore, RedisSessionStore, SessionStore, SQLiteSessionStore
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Context keys the server maintains itself; clients never see or overwrite them
+CONTEXT_EPOCH_KEY = "context_epoch"
+CONTEXT_VERSION_KEY = "context_version"
+CONTEXT_KEY_VERSIONS_KEY = "context_key_versions"
+SUMMARY_KEY = "history_summary"
+SUMMARY_THROUGH_KEY = "history_summary_through"
+INTERNAL_CONTEXT_KEYS = (
+    CONTEXT_EPOCH_KEY, CONTEXT_VERSION_KEY, CONTEXT_KEY_VERSIONS_KEY, SUMMARY_KEY, SUMMARY_THROUGH_KEY
+)
+
+
+def without_internal_keys(context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Drop the server-maintained keys from a context.
+
+    Args:
+        context: A session context, or None
+
+    Returns:
+        The context without internal keys
+    """
+    return {key: value for key, value in (context or {}).items() if key not in INTERNAL_CONTEXT_KEYS}
+
+
+def create_session_store(backend: str, on_evict: Optional[Callable[[str], None]] = None) -> SessionStore:
+    """
+    Create the configured session storage backend.
+
+    Args:
+        backend: "memory", "sqlite" or "redis"
+        on_evict: Optional function called when the in-process store expires or evicts a session
+
+    Returns:
+        The session store
+    """
+    if backend == "memory":
+        return InMemorySessionStore(
+            MAX_SESSIONS,
+            SESSION_TTL_SECONDS,
+            SESSION_MEMORY_MAX_MB * 1024 * 1024,
+            MAX_HISTORY_MESSAGES,
+            on_evict
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH, SESSION_TTL_SECONDS, MAX_HISTORY_MESSAGES)
+    if backend == "redis":
+        return RedisSessionStore(SESSION_REDIS_URL, SESSION_TTL_SECONDS, MAX_HISTORY_MESSAGES)
+
+    raise ValueError(f"Unknown session store {backend!r}, expected 'memory', 'sqlite' or 'redis'")
+
 
 class ConversationMemory:
     """
     A service for managing conversation history and context for chat sessions.
+
+    The sessions themselves live in a SessionStore. The in-process store is bounded by a TTL,
+    a session cap and a memory budget; the SQLite and Redis stores let several API workers
+    share conversations.
+
+    The server holds each session's context. Every change to a client-visible key bumps the
+    context version, so a client that sends back the version it has only receives the keys
+    that changed since. Versions are "<epoch>:<count>" strings, where the epoch is drawn when
+    the context is created, so versions from before a reset or expiry never match.
     """
 
-    def __init__(self):
-        """Initialize the conversation memory service."""
+    def __init__(
+            self,
+            store: Optional[SessionStore] = None,
+            sweep_interval: float = SESSION_SWEEP_INTERVAL,
+            on_evict: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Initialize the conversation memory service.
+
+        Args:
+            store: The session store to use, or None for the one selected by SESSION_STORE
+            sweep_interval: Seconds between background sweeps for expired sessions
+            on_evict: Optional function called with the ID of every expired or evicted session
+        """
         logger.info("Initializing conversation memory service")
 
-        # Dictionary to store conversation history for each session
-        self.conversations = {}
+        self.store = store or create_session_store(SESSION_STORE, on_evict)
 
-        # Dictionary to store user context for each session
-        self.contexts = {}
+        # Expire idle sessions off the request path
+        self._stop = threading.Event()
+        self._sweeper = None
+        if SESSION_TTL_SECONDS > 0 and sweep_interval > 0:
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop,
+                args=(sweep_interval,),
+                name="session-sweeper",
+                daemon=True
+            )
+            self._sweeper.start()
 
         logger.debug("Conversation memory service initialized")
 
+    def _sweep_loop(self, interval: float) -> None:
+        """Expire idle sessions every interval seconds."""
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping expired sessions: {str(e)}")
+
+    def sweep(self) -> int:
+        """
+        Remove every session that has been idle longer than the TTL.
+
+        Returns:
+            The number of sessions removed
+        """
+        removed = self.store.sweep()
+        if removed:
+            logger.debug(f"Expired {removed} idle sessions")
+        return removed
+
     def add_message(
             self,
             session_id: str,
@@ -37,22 +145,7 @@ class ConversationMemory:
             content: The content of the message
         """
         try:
-            # Ensure the session exists
-            if session_id not in self.conversations:
-                logger.debug(f"Creating new conversation history for session {session_id}")
-                self.conversations[session_id] = []
-
-            # Add the message
-            self.conversations[session_id].append({
-                "role": role,
-                "content": content
-            })
-
-            # Truncate history if needed (keep last 20 messages)
-            if len(self.conversations[session_id]) > 20:
-                self.conversations[session_id] = self.conversations[session_id][-20:]
-                logger.debug(f"Truncated conversation history for session {session_id}")
-
+            self.store.append_messages(session_id, [{"role": role, "content": content}])
             logger.debug(f"Added {role} message to session {session_id}")
 
         except Exception as e:
@@ -62,7 +155,7 @@ class ConversationMemory:
             self,
             session_id: str,
             max_messages: Optional[int] = None
-    ) -> List[Dict[str, str]]:
+    ) -> List[Mapping]:
         """
         Get the conversation history for a session.
 
@@ -71,19 +164,13 @@ class ConversationMemory:
             max_messages: The maximum number of messages to return (most recent)
 
         Returns:
-            A list of message dictionaries with 'role' and 'content' keys
+            A list of messages with 'role' and 'content' keys
         """
         try:
-            # Return empty list if session doesn't exist
-            if session_id not in self.conversations:
-                logger.debug(f"No conversation history found for session {session_id}")
-                return []
-
-            history = self.conversations[session_id]
-
-            # Limit to max_messages if specified
-            if max_messages is not None and max_messages > 0:
-                history = history[-max_messages:]
+            # The store reads only the newest max_messages
+            if max_messages is not None and max_messages <= 0:
+                max_messages = None
+            history = self.store.get_messages(session_id, max_messages)
 
             logger.debug(f"Retrieved {len(history)} messages for session {session_id}")
             return history
@@ -104,14 +191,32 @@ class ConversationMemory:
             session_id: The unique identifier for the conversation session
             context_updates: Dictionary of context updates to apply
         """
-        try:
-            # Ensure the session exists
-            if session_id not in self.contexts:
-                logger.debug(f"Creating new context for session {session_id}")
-                self.contexts[session_id] = {}
+        def versioned_updates(context: Dict[str, Any]) -> Dict[str, Any]:
+            # Values that did not change leave the version alone
+            missing = object()
+            updates = {
+                key: value for key, value in context_updates.items()
+                if key in INTERNAL_CONTEXT_KEYS or context.get(key, missing) != value
+            }
+
+            # Record the version at which each client-visible key last changed
+            changed = [key for key in updates if key not in INTERNAL_CONTEXT_KEYS]
+            if changed:
+                version = context.get(CONTEXT_VERSION_KEY, 0) + 1
+                key_versions = dict(context.get(CONTEXT_KEY_VERSIONS_KEY, {}))
+                key_versions.update((key, version) for key in changed)
+                updates[CONTEXT_VERSION_KEY] = version
+                updates[CONTEXT_KEY_VERSIONS_KEY] = key_versions
+
+                # A new context starts a new epoch, so counts from an earlier one are never mistaken for it
+                if not context.get(CONTEXT_EPOCH_KEY):
+                    updates[CONTEXT_EPOCH_KEY] = uuid.uuid4().hex[:12]
+
+            return updates
 
-            # Update the context
-            self.contexts[session_id].update(context_updates)
+        try:
+            # The store reads and writes in one atomic step, so concurrent turns cannot both claim a version
+            self.store.modify_context(session_id, versioned_updates)
             logger.debug(f"Updated context for session {session_id}")
 
         except Exception as e:
@@ -128,18 +233,52 @@ class ConversationMemory:
             A dictionary of context information
         """
         try:
-            # Return empty dict if session doesn't exist
-            if session_id not in self.contexts:
-                logger.debug(f"No context found for session {session_id}")
-                return {}
-
+            context = self.store.get_context(session_id)
             logger.debug(f"Retrieved context for session {session_id}")
-            return self.contexts[session_id]
+            return context
 
         except Exception as e:
             logger.error(f"Error retrieving context: {str(e)}")
             return {}
 
+    def get_context_delta(
+            self,
+            session_id: str,
+            since_version: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any], bool]:
+        """
+        Get the client-visible context keys that changed after a version.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            since_version: The context version the client has, or None for the whole context
+
+        Returns:
+            A tuple of (current_version, changed_keys, full), where full means changed_keys is
+            the whole context and replaces whatever the client holds
+        """
+        try:
+            context = self.store.get_context(session_id)
+            epoch = context.get(CONTEXT_EPOCH_KEY, "")
+            count = context.get(CONTEXT_VERSION_KEY, 0)
+            version = f"{epoch}:{count}" if epoch else ""
+
+            # A version from another epoch, or ahead of this one, belongs to a session that was reset or expired
+            since_epoch, _, since_count = (since_version or "").partition(":")
+            if not epoch or since_epoch != epoch or not since_count.isdigit() or int(since_count) > count:
+                return version, without_internal_keys(context), True
+
+            key_versions = context.get(CONTEXT_KEY_VERSIONS_KEY, {})
+            delta = {
+                key: value for key, value in without_internal_keys(context).items()
+                if key_versions.get(key, 0) > int(since_count)
+            }
+            return version, delta, False
+
+        except Exception as e:
+            logger.error(f"Error retrieving context changes: {str(e)}")
+            return since_version or "", {}, False
+
     def reset_session(self, session_id: str) -> None:
         """
         Reset the conversation history and context for a session.
@@ -148,15 +287,30 @@ class ConversationMemory:
             session_id: The unique identifier for the conversation session
         """
         try:
-            # Clear conversation history
-            if session_id in self.conversations:
-                self.conversations[session_id] = []
+            # Forget the session entirely rather than keeping an empty entry
+            self.store.delete(session_id)
+            logger.debug(f"Reset conversation and context for session {session_id}")
 
-            # Clear context
-            if session_id in self.contexts:
-                self.contexts[session_id] = {}
+        except Exception as e:
+            logger.error(f"Error resetting session: {str(e)}")
 
-            logger.debug(f"Reset conversation and context for session {session_id}")
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get session statistics.
+
+        Returns:
+            A dictionary of statistics from the session store
+        """
+        try:
+            return self.store.stats()
 
         except Exception as e:
-            logger.error(f"Error resetting session: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error retrieving session statistics: {str(e)}")
+            return {}
+
+    def shutdown(self) -> None:
+        """Stop the background sweeper and close the session store."""
+        self._stop.set()
+        if self._sweeper:
+            self._sweeper.join()
+        self.store.close()
@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Optional fields the order stores index; they are case-folded, so they must be strings
+INDEXED_ORDER_FIELDS = ("email", "tracking_number")
+
+
+def parse_order_update(line: str) -> Dict:
+    """
+    Parse one NDJSON order update.
+
+    Args:
+        line: A JSON object with at least an order_id
+
+    Returns:
+        The update dictionary
+
+    Raises:
+        ValueError: If the line is not an object with a usable order_id and indexed fields
+    """
+    update = json.loads(line)
+
+    if not isinstance(update, dict):
+        raise ValueError("update must be a JSON object")
+    if not isinstance(update.get("order_id"), str) or not update["order_id"].strip():
+        raise ValueError("update must have a non-empty string order_id")
+
+    for field in INDEXED_ORDER_FIELDS:
+        if update.get(field) is not None and not isinstance(update[field], str):
+            raise ValueError(f"update {field} must be a string or null")
+
+    return update
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class OrderEventTailer:
+    """
+    Follows an append-only NDJSON log of order updates and applies new lines in batches.
+
+    The byte offset of the last applied line is saved next to the log, so a restart
+    resumes where it stopped. A log that shrinks is treated as rotated and read from the start.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            apply: Callable[[List[Dict]], int],
+            batch_size: int,
+            poll_interval: float
+    ):
+        """
+        Initialize the tailer.
+
+        Args:
+            path: The order event log to follow
+            apply: Function that applies a batch of updates and returns how many were applied; the rest count as rejected
+            batch_size: The most updates passed to apply at once
+            poll_interval: Seconds to wait for new lines once the end of the log is reached
+        """
+        logger.info(f"Initializing order event tailer for {path}")
+
+        self.path = path
+        self.apply = apply
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.offset_path = f"{path}.offset"
+        self.offset = self._load_offset()
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._applied = 0
+        self._rejected = 0
+        self._thread = None
+
+    def start(self) -> None:
+        """Follow the log on a background thread."""
+        self._thread = threading.Thread(target=self._loop, name="order-event-tailer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop following the log after the current batch."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _load_offset(self) -> int:
+        """Read the saved offset, or start from the beginning of the log."""
+        try:
+            with open(self.offset_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_offset(self) -> None:
+        """Persist the offset through a temporary file so a crash never leaves it half written."""
+        temp_path = f"{self.offset_path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(str(self.offset))
+        os.replace(temp_path, self.offset_path)
+
+    def _loop(self) -> None:
+        """Apply new lines until stop() is called."""
+        while not self._stop.is_set():
+            try:
+                if not self.poll():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Error applying order events from {self.path}: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+    def poll(self) -> int:
+        """
+        Apply the complete lines appended since the last poll.
+
+        Returns:
+            The number of updates applied
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        if os.path.getsize(self.path) < self.offset:
+            logger.info(f"Order event log {self.path} shrank, reading it from the start")
+            self.offset = 0
+
+        applied = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+
+            for batch in iter_batches(self._read_lines(f), self.batch_size):
+                updates = [update for update, _ in batch if update is not None]
+                if updates:
+                    batch_applied = self.apply(updates)
+                    applied += batch_applied
+
+                    # e.g. partial updates for orders that do not exist
+                    if batch_applied < len(updates):
+                        with self._lock:
+                            self._rejected += len(updates) - batch_applied
+
+                # Only move past lines that have been applied
+                self.offset = batch[-1][1]
+                self._save_offset()
+
+        with self._lock:
+            self._applied += applied
+
+        if applied:
+            logger.debug(f"Applied {applied} order events from {self.path}")
+        return applied
+
+    def _read_lines(self, f) -> Iterator[Tuple[Optional[Dict], int]]:
+        """
+        Yield (update, end_offset) for each complete line, with None for lines that cannot be parsed.
+
+        A partial last line is left for the next poll.
+        """
+        for raw in iter(f.readline, b""):
+            if not raw.endswith(b"\n"):
+                break
+
+            end = f.tell()
+            if not raw.strip():
+                continue
+
+            try:
+                update = parse_order_update(raw.decode("utf-8"))
+            except ValueError as e:
+                logger.warning(f"Skipping invalid order event in {self.path}: {str(e)}")
+                with self._lock:
+                    self._rejected += 1
+                update = None
+
+            yield update, end
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get ingestion statistics.
+
+        Returns:
+            A dictionary with the applied and rejected counts and the current offset
+        """
+        with self._lock:
+            return {"path": self.path, "applied": self._applied, "rejected": self._rejected, "offset": self.offset}
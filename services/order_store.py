@@ -0,0 +1,459 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction, and keys per IN query (kept under SQLite's default limit of 999 bound parameters)
+UPSERT_CHUNK_SIZE = 500
+
+# Fields every stored order must have; the chatbot's order answers read them
+REQUIRED_ORDER_FIELDS = ("order_id", "status", "order_date")
+
+
+def normalize_key(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize an order ID, email or tracking number for lookups.
+
+    Args:
+        value: The raw value
+
+    Returns:
+        The case-folded value without surrounding whitespace, or None if it is empty
+    """
+    if not value:
+        return None
+    return value.strip().casefold() or None
+
+
+def merge_order(stored: Optional[Dict], update: Dict) -> Dict:
+    """
+    Apply a partial update to an order without modifying the stored dictionary.
+
+    Args:
+        stored: The current order, or None for a new order
+        update: The fields to change, including order_id
+
+    Returns:
+        A new order dictionary that keeps the stored order's ID spelling
+    """
+    if stored is None:
+        return dict(update)
+    return {**stored, **update, "order_id": stored["order_id"]}
+
+
+def is_complete_order(order: Dict) -> bool:
+    """
+    Check that an order has every field in REQUIRED_ORDER_FIELDS.
+
+    Stores skip incomplete orders, so an update for an unknown order only creates it when
+    it carries the whole record.
+
+    Args:
+        order: The order dictionary, after any merge
+
+    Returns:
+        True if no required field is missing or empty
+    """
+    return all(order.get(field) for field in REQUIRED_ORDER_FIELDS)
+
+
+class OrderStore(ABC):
+    """
+    Interface of the order backends used by OrderTrackingService.
+    """
+
+    @abstractmethod
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        """
+        Look up an order by ID, ignoring case.
+
+        Args:
+            order_id: The ID of the order
+
+        Returns:
+            The order dictionary or None if not found
+        """
+
+    @abstractmethod
+    def find_by_email(self, email: str) -> List[Dict]:
+        """
+        Find the orders placed with an email address, ignoring case.
+
+        Args:
+            email: The customer's email address
+
+        Returns:
+            The matching order dictionaries
+        """
+
+    @abstractmethod
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Look up many orders by ID in one batched query.
+
+        Args:
+            order_ids: The IDs of the orders
+
+        Returns:
+            The orders found, keyed by normalized order ID
+        """
+
+    @abstractmethod
+    def find_by_emails(self, emails: Iterable[str]) -> Dict[str, List[Dict]]:
+        """
+        Find the orders of many email addresses in one batched query.
+
+        Args:
+            emails: The customers' email addresses
+
+        Returns:
+            The orders found, keyed by normalized email
+        """
+
+    @abstractmethod
+    def get_by_tracking_number(self, tracking_number: str) -> Optional[Dict]:
+        """
+        Look up the order shipped with a tracking number, ignoring case.
+
+        Args:
+            tracking_number: The carrier tracking number
+
+        Returns:
+            The order dictionary or None if not found
+        """
+
+    @abstractmethod
+    def upsert_many(self, orders: Iterable[Dict], merge: bool = False) -> int:
+        """
+        Insert or replace orders, keyed by their order_id.
+
+        Orders that would be stored without one of the REQUIRED_ORDER_FIELDS are skipped,
+        such as partial updates for orders that do not exist yet.
+
+        Args:
+            orders: Order dictionaries, each with an order_id
+            merge: Update only the fields given instead of replacing the whole order
+
+        Returns:
+            The number of orders written
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        """Count the stored orders."""
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class DictOrderStore(OrderStore):
+    """
+    Keeps every order in memory, with hash indexes on the case-folded order ID, email and tracking number.
+
+    Memory grows with the number of orders, so this backend is meant for tests and small demos.
+    """
+
+    def __init__(self, orders: Dict[str, Dict]):
+        """
+        Initialize the store and build its indexes.
+
+        Args:
+            orders: Orders keyed by order ID
+        """
+        self._lock = threading.Lock()
+
+        # Normalized order ID -> order
+        self._orders = {}
+
+        # Normalized email -> normalized order IDs (a dict keeps insertion order and removes in O(1))
+        self._by_email = {}
+
+        # Normalized tracking number -> normalized order ID
+        self._by_tracking = {}
+
+        self.upsert_many(orders.values())
+
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        return self._orders.get(normalize_key(order_id))
+
+    def find_by_email(self, email: str) -> List[Dict]:
+        with self._lock:
+            order_keys = list(self._by_email.get(normalize_key(email), ()))
+        return [self._orders[key] for key in order_keys if key in self._orders]
+
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Dict]:
+        found = {}
+        for order_id in order_ids:
+            key = normalize_key(order_id)
+            if key in self._orders:
+                found[key] = self._orders[key]
+        return found
+
+    def find_by_emails(self, emails: Iterable[str]) -> Dict[str, List[Dict]]:
+        found = {}
+        for email in emails:
+            key = normalize_key(email)
+            orders = self.find_by_email(email) if key else []
+            if orders:
+                found[key] = orders
+        return found
+
+    def get_by_tracking_number(self, tracking_number: str) -> Optional[Dict]:
+        order_key = self._by_tracking.get(normalize_key(tracking_number))
+        return self._orders.get(order_key) if order_key else None
+
+    def upsert_many(self, orders: Iterable[Dict], merge: bool = False) -> int:
+        written = 0
+        with self._lock:
+            for order in orders:
+                if merge:
+                    order = merge_order(self._orders.get(normalize_key(order["order_id"])), order)
+                if not is_complete_order(order):
+                    logger.debug(f"Skipping incomplete order {order['order_id']}")
+                    continue
+                self._index(order)
+                written += 1
+        return written
+
+    def _index(self, order: Dict) -> None:
+        """Store an order and move its secondary index entries; the lock must be held."""
+        order_key = normalize_key(order["order_id"])
+        email_key = normalize_key(order.get("email"))
+        tracking_key = normalize_key(order.get("tracking_number"))
+
+        # Drop the entries of the version being replaced
+        previous = self._orders.get(order_key)
+        if previous is not None:
+            previous_email = normalize_key(previous.get("email"))
+            if previous_email != email_key and previous_email in self._by_email:
+                self._by_email[previous_email].pop(order_key, None)
+                if not self._by_email[previous_email]:
+                    del self._by_email[previous_email]
+
+            previous_tracking = normalize_key(previous.get("tracking_number"))
+            if previous_tracking != tracking_key and self._by_tracking.get(previous_tracking) == order_key:
+                del self._by_tracking[previous_tracking]
+
+        self._orders[order_key] = order
+
+        if email_key:
+            self._by_email.setdefault(email_key, {})[order_key] = None
+        if tracking_key:
+            self._by_tracking[tracking_key] = order_key
+
+    def count(self) -> int:
+        return len(self._orders)
+
+
+class SQLiteOrderStore(OrderStore):
+    """
+    Stores orders in a SQLite database with indexes on the normalized order ID, email and tracking number.
+
+    Lookups are B-tree searches, and only the rows a query returns are held in memory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (and if needed create) the order database.
+
+        Args:
+            path: The SQLite database file
+        """
+        logger.info(f"Opening SQLite order store at {path}")
+
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with self._connection() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS orders (
+                    order_key TEXT PRIMARY KEY,
+                    email_key TEXT,
+                    tracking_key TEXT,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS orders_email_key ON orders (email_key);
+                CREATE INDEX IF NOT EXISTS orders_tracking_key ON orders (tracking_key);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection; sqlite3 connections must not be shared between threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Each connection is only used by its own thread, but close() runs on the shutdown thread
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+            with self._lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT data FROM orders WHERE order_key = ?",
+            (normalize_key(order_id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_email(self, email: str) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT data FROM orders WHERE email_key = ? ORDER BY rowid",
+            (normalize_key(email),)
+        ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Dict]:
+        found = {}
+        for key, data in self._select_in("order_key", order_ids):
+            found[key] = json.loads(data)
+        return found
+
+    def find_by_emails(self, emails: Iterable[str]) -> Dict[str, List[Dict]]:
+        found = {}
+        for key, data in self._select_in("email_key", emails, order_by="rowid"):
+            found.setdefault(key, []).append(json.loads(data))
+        return found
+
+    def _select_in(self, column: str, values: Iterable[str], order_by: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (key, data) rows whose column matches any of the normalized values, one IN query per chunk."""
+        keys = list({key for key in map(normalize_key, values) if key})
+        order_clause = f" ORDER BY {order_by}" if order_by else ""
+        connection = self._connection()
+
+        for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+            chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            yield from connection.execute(
+                f"SELECT {column}, data FROM orders WHERE {column} IN ({placeholders}){order_clause}",
+                chunk
+            )
+
+    def get_by_tracking_number(self, tracking_number: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT data FROM orders WHERE tracking_key = ? LIMIT 1",
+            (normalize_key(tracking_number),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert_many(self, orders: Iterable[Dict], merge: bool = False) -> int:
+        written = 0
+        chunk = []
+
+        for order in orders:
+            chunk.append(order)
+
+            if len(chunk) >= UPSERT_CHUNK_SIZE:
+                written += self._write_chunk(chunk, merge)
+                chunk = []
+
+        if chunk:
+            written += self._write_chunk(chunk, merge)
+
+        return written
+
+    def _write_chunk(self, orders: List[Dict], merge: bool) -> int:
+        """Write one chunk of orders in a single transaction."""
+        connection = self._connection()
+
+        with connection:
+            # Take the write lock before reading, so concurrent merges cannot lose updates
+            connection.execute("BEGIN IMMEDIATE")
+
+            latest = {}
+            if merge:
+                keys = list({normalize_key(order["order_id"]) for order in orders})
+                placeholders = ", ".join("?" * len(keys))
+                latest = {
+                    key: json.loads(data)
+                    for key, data in connection.execute(
+                        f"SELECT order_key, data FROM orders WHERE order_key IN ({placeholders})",
+                        keys
+                    )
+                }
+
+            # Later updates to the same order win, as they would if applied one by one
+            written = 0
+            for order in orders:
+                key = normalize_key(order["order_id"])
+                order = merge_order(latest.get(key), order) if merge else order
+                if not is_complete_order(order):
+                    logger.debug(f"Skipping incomplete order {order['order_id']}")
+                    continue
+                latest[key] = order
+                written += 1
+
+            connection.executemany(
+                """
+                INSERT INTO orders (order_key, email_key, tracking_key, data) VALUES (?, ?, ?, ?)
+                ON CONFLICT (order_key) DO UPDATE SET
+                    email_key = excluded.email_key,
+                    tracking_key = excluded.tracking_key,
+                    data = excluded.data
+                """,
+                [
+                    (
+                        key,
+                        normalize_key(order.get("email")),
+                        normalize_key(order.get("tracking_number")),
+                        json.dumps(order)
+                    )
+                    for key, order in latest.items()
+                ]
+            )
+
+        return written
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """
+        Read a value the service keeps about the database, such as where its orders came from.
+
+        Args:
+            key: The name of the value
+
+        Returns:
+            The value, or None if it was never set
+        """
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """
+        Store a value about the database.
+
+        Args:
+            key: The name of the value
+            value: The value to store
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
@@ -1,15 +1,55 @@
+import hashlib
 import json
 import logging
 import os
 import random
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
-from config import ORDER_DATA_PATH
+from config import (
+    ORDER_DATA_PATH, ORDER_STORE, ORDER_DB_PATH, ORDER_EVENT_LOG_PATH, ORDER_INGEST_BATCH_SIZE, ORDER_EVENT_POLL_INTERVAL
+)
+from services.order_ingest import OrderEventTailer, iter_batches
+from services.order_store import DictOrderStore, OrderStore, SQLiteOrderStore
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Meta key under which the order database records the digest of the data file it imported
+ORDER_DATA_DIGEST_KEY = "order_data_sha256"
+
+
+def file_digest(path: str) -> str:
+    """Hash a file's contents in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def project_order(order: Dict, fields: Optional[List[str]]) -> Dict:
+    """
+    Keep only the requested fields of an order.
+
+    Args:
+        order: The order dictionary
+        fields: The fields to keep, or None for the whole order; order_id is always kept
+
+    Returns:
+        The projected order
+    """
+    if fields is None:
+        return order
+
+    projected = {"order_id": order["order_id"]}
+    for field in fields:
+        if field in order:
+            projected[field] = order[field]
+    return projected
+
 
 class OrderTrackingService:
     """
@@ -21,15 +61,72 @@ class OrderTrackingService:
         logger.info("Initializing order tracking service")
 
         try:
-            # Load or create order data
-            self.create_or_load_order_data()
+            # Open the order backend
+            self.store = self.open_store(ORDER_STORE)
+
+            self._ingest_lock = threading.Lock()
+            self._ingested = 0
+            self._ingest_seconds = 0.0
+
+            # Follow the order event log if one is configured
+            self.event_tailer = None
+            if ORDER_EVENT_LOG_PATH:
+                self.event_tailer = OrderEventTailer(
+                    ORDER_EVENT_LOG_PATH,
+                    self.upsert_orders,
+                    ORDER_INGEST_BATCH_SIZE,
+                    ORDER_EVENT_POLL_INTERVAL
+                )
+                self.event_tailer.start()
+
             logger.debug("Order tracking service initialized")
 
         except Exception as e:
             logger.error(f"Error initializing order tracking service: {str(e)}")
             raise RuntimeError(f"Failed to initialize order tracking service: {str(e)}")
 
-    def create_or_load_order_data(self):
+    def open_store(self, backend: str) -> OrderStore:
+        """
+        Open the configured order backend, seeding it from the order data file.
+
+        The SQLite database remembers the digest of the file it imported, and imports the file
+        again when it has changed since. Orders that only exist in the database are kept.
+
+        Args:
+            backend: "sqlite" or "dict"
+
+        Returns:
+            The order store
+        """
+        if backend == "dict":
+            return DictOrderStore(self.create_or_load_order_data())
+
+        if backend == "sqlite":
+            store = SQLiteOrderStore(ORDER_DB_PATH)
+            orders = None
+
+            # An empty database is seeded, which also creates the sample data file if needed
+            if store.count() == 0 or not os.path.exists(ORDER_DATA_PATH):
+                orders = self.create_or_load_order_data()
+
+            digest = file_digest(ORDER_DATA_PATH)
+            imported_digest = store.get_meta(ORDER_DATA_DIGEST_KEY)
+
+            # Edits to the data file replace the stored copies of the orders it contains
+            if orders is None and imported_digest is not None and imported_digest != digest:
+                logger.info(f"{ORDER_DATA_PATH} changed since it was imported into {ORDER_DB_PATH}, importing it again")
+                orders = self.create_or_load_order_data()
+
+            if orders is not None:
+                written = store.upsert_many(orders.values())
+                logger.info(f"Imported {written} orders into {ORDER_DB_PATH}")
+
+            store.set_meta(ORDER_DATA_DIGEST_KEY, digest)
+            return store
+
+        raise ValueError(f"Unknown order store {backend!r}, expected 'sqlite' or 'dict'")
+
+    def create_or_load_order_data(self) -> Dict[str, Dict]:
         """Create order data file if it doesn't exist, or load existing data."""
         try:
             if not os.path.exists(ORDER_DATA_PATH):
@@ -103,15 +200,16 @@ class OrderTrackingService:
                 with open(ORDER_DATA_PATH, 'w') as f:
                     json.dump(sample_orders, f, indent=2)
 
-                self.orders = sample_orders
                 logger.info(f"Created sample order data with {len(sample_orders)} orders")
+                return sample_orders
             else:
                 # Load existing orders
                 logger.debug(f"Loading existing order data from {ORDER_DATA_PATH}")
                 with open(ORDER_DATA_PATH, 'r') as f:
-                    self.orders = json.load(f)
+                    orders = json.load(f)
 
-                logger.info(f"Loaded {len(self.orders)} orders")
+                logger.info(f"Loaded {len(orders)} orders")
+                return orders
 
         except Exception as e:
             logger.error(f"Error creating or loading order data: {str(e)}")
@@ -130,16 +228,10 @@ class OrderTrackingService:
         try:
             logger.debug(f"Retrieving order: {order_id}")
 
-            # Check if order exists
-            if order_id in self.orders:
-                logger.debug(f"Found order: {order_id}")
-                return self.orders[order_id]
-
-            # Try case-insensitive search (for convenience)
-            for key, order in self.orders.items():
-                if key.lower() == order_id.lower():
-                    logger.debug(f"Found order with case-insensitive match: {key}")
-                    return order
+            order = self.store.get_order(order_id)
+            if order:
+                logger.debug(f"Found order: {order['order_id']}")
+                return order
 
             logger.debug(f"Order not found: {order_id}")
             return None
@@ -148,6 +240,78 @@ class OrderTrackingService:
             logger.error(f"Error retrieving order {order_id}: {str(e)}")
             return None
 
+    def get_orders(self, order_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Get many orders with one batched lookup.
+
+        Args:
+            order_ids: The IDs of the orders to retrieve
+
+        Returns:
+            The orders found, keyed by normalized order ID
+
+        Raises:
+            Exception: If the order store fails, so a failed lookup is not reported as "not found"
+        """
+        try:
+            logger.debug(f"Retrieving {len(order_ids)} orders")
+
+            orders = self.store.get_orders(order_ids)
+
+            logger.debug(f"Found {len(orders)} of {len(order_ids)} orders")
+            return orders
+
+        except Exception as e:
+            logger.error(f"Error retrieving {len(order_ids)} orders: {str(e)}")
+            raise
+
+    def search_orders_by_emails(self, emails: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Search for the orders of many email addresses with one batched lookup.
+
+        Args:
+            emails: The customers' email addresses
+
+        Returns:
+            Lists of matching orders, keyed by normalized email
+
+        Raises:
+            Exception: If the order store fails, so a failed lookup is not reported as no orders
+        """
+        try:
+            logger.debug(f"Searching orders for {len(emails)} emails")
+
+            return self.store.find_by_emails(emails)
+
+        except Exception as e:
+            logger.error(f"Error searching orders for {len(emails)} emails: {str(e)}")
+            raise
+
+    def get_order_by_tracking_number(self, tracking_number: str) -> Optional[Dict]:
+        """
+        Get the order shipped with a tracking number.
+
+        Args:
+            tracking_number: The carrier tracking number (e.g. TRK-12345)
+
+        Returns:
+            Order information dictionary or None if not found
+        """
+        try:
+            logger.debug(f"Retrieving order for tracking number: {tracking_number}")
+
+            order = self.store.get_by_tracking_number(tracking_number)
+            if order:
+                logger.debug(f"Found order {order['order_id']} for tracking number {tracking_number}")
+                return order
+
+            logger.debug(f"No order found for tracking number: {tracking_number}")
+            return None
+
+        except Exception as e:
+            logger.error(f"Error retrieving order for tracking number {tracking_number}: {str(e)}")
+            return None
+
     def get_order_status(self, order_id: str) -> Optional[str]:
         """
         Get the status of a specific order.
@@ -184,15 +348,58 @@ class OrderTrackingService:
         try:
             logger.debug(f"Searching orders for email: {email}")
 
-            matching_orders = []
-
-            for order_id, order in self.orders.items():
-                if order.get("email", "").lower() == email.lower():
-                    matching_orders.append(order)
+            matching_orders = self.store.find_by_email(email)
 
             logger.debug(f"Found {len(matching_orders)} orders for email {email}")
             return matching_orders
 
         except Exception as e:
             logger.error(f"Error searching orders by email {email}: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    def upsert_orders(self, updates: Iterable[Dict]) -> int:
+        """
+        Apply order updates in batches; the lookup indexes are updated with each batch.
+
+        Each update is merged into the stored order, so it only needs the order_id and the
+        fields that changed. An unknown order is only created from an update that has every
+        field in REQUIRED_ORDER_FIELDS; other updates for unknown orders are skipped.
+
+        Args:
+            updates: Order update dictionaries, each with an order_id
+
+        Returns:
+            The number of updates applied, which leaves out skipped updates
+        """
+        start = time.perf_counter()
+        applied = 0
+
+        for batch in iter_batches(updates, ORDER_INGEST_BATCH_SIZE):
+            applied += self.store.upsert_many(batch, merge=True)
+
+        seconds = time.perf_counter() - start
+        with self._ingest_lock:
+            self._ingested += applied
+            self._ingest_seconds += seconds
+
+        logger.debug(f"Applied {applied} order updates in {seconds:.3f}s")
+        return applied
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get order ingestion statistics.
+
+        Returns:
+            A dictionary with the number of updates applied and their throughput
+        """
+        with self._ingest_lock:
+            stats = {
+                "store": ORDER_STORE,
+                "updates_applied": self._ingested,
+                "updates_per_second": round(self._ingested / self._ingest_seconds) if self._ingest_seconds else 0
+            }
+
+        if self.event_tailer:
+            stats["event_log"] = self.event_tailer.stats()
+
+        return stats
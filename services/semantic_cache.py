@@ -0,0 +1,143 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from services.faq_index import normalize_vectors
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Past model answers, found again by the meaning of the question rather than its exact text.
+
+    Question embeddings live in an inner-product FAISS index over unit vectors, so scores are
+    cosine similarities, wrapped in an ID map so the least recently used entries can be evicted. A lookup
+    answers when the nearest cached question is within the similarity threshold.
+    """
+
+    def __init__(self, max_entries: int, threshold: float, ttl_seconds: float = 0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: The maximum number of answers to keep; 0 disables the cache
+            threshold: Cosine similarity at or above which a cached answer is reused
+            ttl_seconds: Seconds after which an answer expires (0 keeps answers until evicted)
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+
+        # Created on the first insert, once the embedding dimension is known
+        self._index = None
+        # id -> (question, answer, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        """
+        Find the answer to the most similar cached question.
+
+        Args:
+            embedding: The question embedding
+
+        Returns:
+            The cached answer, or None if no cached question is similar enough
+        """
+        if self.max_entries <= 0:
+            return None
+
+        vector = normalize_vectors([embedding])
+
+        with self._lock:
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(vector, 1)
+                entry_id = int(ids[0][0])
+                entry = self._entries.get(entry_id)
+
+                if entry is not None and entry[2] and entry[2] <= time.monotonic():
+                    self._remove([entry_id])
+                    entry = None
+
+                if entry is not None and scores[0][0] >= self.threshold:
+                    self._entries.move_to_end(entry_id)
+                    self._hits += 1
+                    logger.debug(f"Semantic cache hit on {entry[0]!r} with similarity {scores[0][0]:.3f}")
+                    return entry[1]
+
+            self._misses += 1
+            return None
+
+    def add(self, embedding: List[float], question: str, answer: str) -> None:
+        """
+        Cache the answer to a question.
+
+        Args:
+            embedding: The question embedding
+            question: The question, kept for logging
+            answer: The answer to reuse for similar questions
+        """
+        if self.max_entries <= 0:
+            return
+
+        vector = normalize_vectors([embedding])
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (question, answer, expires_at)
+
+            # Removing from a flat index rewrites it, so make room for a tenth of the cache at once
+            if len(self._entries) > self.max_entries:
+                count = len(self._entries) - self.max_entries + max(1, self.max_entries // 10)
+                oldest = list(itertools.islice(self._entries, count))
+                self._remove(oldest)
+                self._evictions += len(oldest)
+
+    def _remove(self, entry_ids: List[int]) -> None:
+        """Drop entries from the index and the entry map. The lock must be held."""
+        self._index.remove_ids(np.array(entry_ids, dtype="int64"))
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+
+    def clear(self) -> None:
+        """Remove every answer."""
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            A dictionary with size, hit, miss and eviction counts
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions
+            }
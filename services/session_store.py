@@ -0,0 +1,711 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from services.local_redis import LocalRedis, LocalWatchError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class Message(Mapping):
+    """
+    A compact, immutable chat message.
+
+    Reads like the {"role": ..., "content": ...} dictionaries used elsewhere, but stores its
+    fields in slots, which takes a fraction of a dictionary's memory. The seq attribute numbers
+    the messages of a session in the order they were appended; it only ever grows, even after
+    older messages have been dropped.
+    """
+
+    __slots__ = ("role", "content", "seq")
+
+    def __init__(self, role: str, content: str, seq: int = 0):
+        # Roles repeat in every session, so share one string per role
+        object.__setattr__(self, "role", sys.intern(role))
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "seq", seq)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Message records are immutable")
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(("role", "content"))
+
+    def __len__(self) -> int:
+        return 2
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, seq={self.seq})"
+
+
+def last_messages(messages: Sequence, count: Optional[int]) -> List:
+    """
+    Take the newest messages of a history without copying the records themselves.
+
+    Args:
+        messages: The history, oldest first (a list or deque)
+        count: How many messages to take, or None/0 for all of them
+
+    Returns:
+        The newest messages, oldest first
+    """
+    if not count or count >= len(messages):
+        return list(messages)
+
+    # Walk back from the end so a deque never has to be traversed from the front
+    newest = list(islice(reversed(messages), count))
+    newest.reverse()
+    return newest
+
+
+class SessionStore(ABC):
+    """
+    Interface of the conversation storage backends used by ConversationMemory.
+
+    Every method is one round trip to the backend, so a turn costs a fixed number of
+    reads and writes however long the conversation is.
+    """
+
+    @abstractmethod
+    def get_messages(self, session_id: str, max_messages: Optional[int] = None) -> List[Mapping]:
+        """
+        Read a session's messages, oldest first.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            max_messages: Only read this many of the newest messages (None or 0 for all)
+
+        Returns:
+            A list of Message records, whose seq increases with every message appended
+        """
+
+    @abstractmethod
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        """
+        Read a session's context.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+
+        Returns:
+            A dictionary of context information
+        """
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """
+        Append messages to a session, creating it if needed and keeping only the newest ones.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            messages: Message dictionaries with 'role' and 'content' keys
+        """
+
+    @abstractmethod
+    def update_context(self, session_id: str, updates: Dict[str, Any]) -> None:
+        """
+        Merge updates into a session's context, creating the session if needed.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            updates: Context keys and values to set
+        """
+
+    @abstractmethod
+    def modify_context(self, session_id: str, modify: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Read a session's context and merge the updates computed from it, as one atomic step.
+
+        No other write to the session's context can happen between the read and the write,
+        so updates that depend on the current values (such as counters) are never lost.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+            modify: Function that takes the current context and returns the keys and values to set
+
+        Returns:
+            The updates that were merged
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """
+        Remove a session's messages and context.
+
+        Args:
+            session_id: The unique identifier for the conversation session
+        """
+
+    def sweep(self) -> int:
+        """
+        Remove sessions that have been idle longer than the TTL.
+
+        Returns:
+            The number of sessions removed
+        """
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get storage statistics."""
+        return {}
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class _Session:
+    """The history, context and bookkeeping of one conversation session."""
+
+    __slots__ = ("messages", "appended", "context", "last_active", "context_bytes", "nbytes")
+
+    def __init__(self, max_messages: int):
+        # A full deque drops its oldest message in O(1) as a new one is appended
+        self.messages = deque(maxlen=max_messages)
+        self.appended = 0
+        self.context = {}
+        self.last_active = time.monotonic()
+        self.context_bytes = 0
+        self.nbytes = sys.getsizeof(self.messages)
+
+
+def _message_bytes(message: Message) -> int:
+    """Approximate the memory held by one message record."""
+    return sys.getsizeof(message) + sys.getsizeof(message.content)
+
+
+def _context_bytes(context: Dict[str, Any]) -> int:
+    """Approximate the memory held by a session context by its serialized size."""
+    try:
+        return len(json.dumps(context, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(context)
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Keeps sessions in this process, in LRU order.
+
+    Idle sessions expire after the TTL, and the least recently used sessions are evicted
+    once there are too many or they hold too much memory.
+    """
+
+    def __init__(
+            self,
+            max_sessions: int,
+            ttl_seconds: float,
+            max_bytes: int,
+            max_messages: int,
+            on_evict: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: The most sessions kept at once
+            ttl_seconds: How long a session may sit idle before it expires (0 disables expiry)
+            max_bytes: Approximate memory budget for all sessions
+            max_messages: Messages kept per session
+            on_evict: Optional function called with the ID of every expired or evicted session
+        """
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+
+        # Sessions in least to most recently used order
+        self.sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def _get_session(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        """Find a live session and mark it as used; the lock must be held."""
+        session = self.sessions.get(session_id)
+
+        if session is not None and self._is_expired(session, time.monotonic()):
+            self._drop(session_id)
+            self._expired += 1
+            session = None
+
+        if session is None:
+            if not create:
+                return None
+
+            logger.debug(f"Creating new session {session_id}")
+            session = _Session(self.max_messages)
+            self.sessions[session_id] = session
+            self._bytes += session.nbytes
+
+        session.last_active = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def _is_expired(self, session: _Session, now: float) -> bool:
+        """Check whether a session has been idle longer than the TTL."""
+        return self.ttl_seconds > 0 and now - session.last_active > self.ttl_seconds
+
+    def _resize(self, session: _Session, delta: int) -> None:
+        """Account for a change in a session's size and evict others if the limits are exceeded; the lock must be held."""
+        session.nbytes += delta
+        self._bytes += delta
+
+        # The session being written is the most recently used, so it is evicted last
+        while len(self.sessions) > 1 and (len(self.sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            evicted_id = next(iter(self.sessions))
+            self._drop(evicted_id)
+            self._evicted += 1
+            logger.debug(f"Evicted session {evicted_id}")
+
+    def _drop(self, session_id: str, notify: bool = True) -> None:
+        """Remove a session and release its bytes; the lock must be held."""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+
+        self._bytes -= session.nbytes
+
+        if notify and self.on_evict:
+            try:
+                self.on_evict(session_id)
+            except Exception as e:
+                logger.error(f"Error releasing resources of session {session_id}: {str(e)}")
+
+    def get_messages(self, session_id: str, max_messages: Optional[int] = None) -> List[Mapping]:
+        with self._lock:
+            session = self._get_session(session_id)
+            return last_messages(session.messages, max_messages) if session else []
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._get_session(session_id)
+            return dict(session.context) if session else {}
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        with self._lock:
+            session = self._get_session(session_id, create=True)
+            delta = 0
+
+            for message in messages:
+                session.appended += 1
+                record = Message(message["role"], message["content"], session.appended)
+
+                # Appending to a full deque drops the oldest message
+                if len(session.messages) == session.messages.maxlen:
+                    delta -= _message_bytes(session.messages[0])
+
+                session.messages.append(record)
+                delta += _message_bytes(record)
+
+            self._resize(session, delta)
+
+    def update_context(self, session_id: str, updates: Dict[str, Any]) -> None:
+        with self._lock:
+            session = self._get_session(session_id, create=True)
+            session.context.update(updates)
+
+            context_bytes = _context_bytes(session.context)
+            self._resize(session, context_bytes - session.context_bytes)
+            session.context_bytes = context_bytes
+
+    def modify_context(self, session_id: str, modify: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            session = self._get_session(session_id)
+            updates = modify(dict(session.context) if session else {})
+            if updates:
+                self.update_context(session_id, updates)
+            return updates
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._drop(session_id, notify=False)
+
+    def sweep(self) -> int:
+        removed = 0
+        now = time.monotonic()
+
+        with self._lock:
+            # Sessions are in LRU order, so expired ones are all at the front
+            while self.sessions:
+                session_id, session = next(iter(self.sessions.items()))
+                if not self._is_expired(session, now):
+                    break
+
+                self._drop(session_id)
+                removed += 1
+
+            self._expired += removed
+
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "expired": self._expired,
+                "evicted": self._evicted
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Keeps sessions in a SQLite database that every API worker on a host can open.
+
+    Each write is a single transaction, and idle sessions are removed by sweep().
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_messages: int):
+        """
+        Open (and if needed create) the session database.
+
+        Args:
+            path: The SQLite database file
+            ttl_seconds: How long a session may sit idle before it expires (0 disables expiry)
+            max_messages: Messages kept per session
+        """
+        logger.info(f"Opening SQLite session store at {path}")
+
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._expired = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with self._connection() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    context TEXT NOT NULL DEFAULT '{}',
+                    last_active REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection; sqlite3 connections must not be shared between threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Each connection is only used by its own thread, but close() runs on the shutdown thread
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+            with self._lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def _cutoff(self) -> float:
+        """The last_active time before which a session has expired."""
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+
+    def _drop_expired(self, connection: sqlite3.Connection, session_id: str) -> None:
+        """Delete a session that expired but was not swept yet, so a write starts it afresh; runs inside the write transaction."""
+        cutoff = self._cutoff()
+        expired = connection.execute(
+            "DELETE FROM sessions WHERE session_id = ? AND last_active <= ?",
+            (session_id, cutoff)
+        ).rowcount
+
+        if expired:
+            connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            with self._lock:
+                self._expired += expired
+
+    def get_messages(self, session_id: str, max_messages: Optional[int] = None) -> List[Mapping]:
+        rows = self._connection().execute(
+            """
+            SELECT m.id, m.role, m.content FROM messages m JOIN sessions s ON s.session_id = m.session_id
+            WHERE m.session_id = ? AND s.last_active > ? ORDER BY m.id DESC LIMIT ?
+            """,
+            (session_id, self._cutoff(), max_messages or -1)
+        ).fetchall()
+
+        # Row IDs are never reused, so they number a session's messages in order
+        return [Message(role, content, seq) for seq, role, content in reversed(rows)]
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        row = self._connection().execute(
+            "SELECT context FROM sessions WHERE session_id = ? AND last_active > ?",
+            (session_id, self._cutoff())
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            self._drop_expired(connection, session_id)
+
+            connection.execute(
+                """
+                INSERT INTO sessions (session_id, last_active) VALUES (?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET last_active = excluded.last_active
+                """,
+                (session_id, time.time())
+            )
+            connection.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, message["role"], message["content"]) for message in messages]
+            )
+
+            # Keep only the newest max_messages
+            connection.execute(
+                """
+                DELETE FROM messages WHERE session_id = ? AND id <= (
+                    SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (session_id, session_id, self.max_messages)
+            )
+
+    def update_context(self, session_id: str, updates: Dict[str, Any]) -> None:
+        self.modify_context(session_id, lambda context: updates)
+
+    def modify_context(self, session_id: str, modify: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        connection = self._connection()
+        with connection:
+            # Take the write lock before reading, so concurrent updates cannot lose keys
+            connection.execute("BEGIN IMMEDIATE")
+            self._drop_expired(connection, session_id)
+
+            row = connection.execute(
+                "SELECT context FROM sessions WHERE session_id = ? AND last_active > ?",
+                (session_id, self._cutoff())
+            ).fetchone()
+
+            context = json.loads(row[0]) if row else {}
+            updates = modify(dict(context))
+
+            if updates:
+                context.update(updates)
+                connection.execute(
+                    """
+                    INSERT INTO sessions (session_id, context, last_active) VALUES (?, ?, ?)
+                    ON CONFLICT (session_id) DO UPDATE SET context = excluded.context, last_active = excluded.last_active
+                    """,
+                    (session_id, json.dumps(context, default=str), time.time())
+                )
+
+        return updates
+
+    def delete(self, session_id: str) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self) -> int:
+        if self.ttl_seconds <= 0:
+            return 0
+
+        cutoff = self._cutoff()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active <= ?)",
+                (cutoff,)
+            )
+            removed = connection.execute("DELETE FROM sessions WHERE last_active <= ?", (cutoff,)).rowcount
+
+        with self._lock:
+            self._expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            expired = self._expired
+
+        return {
+            "backend": "sqlite",
+            "sessions": self._connection().execute(
+                "SELECT COUNT(*) FROM sessions WHERE last_active > ?",
+                (self._cutoff(),)
+            ).fetchone()[0],
+            "ttl_seconds": self.ttl_seconds,
+            "expired": expired
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def _decode_hash(values: Dict) -> Dict[str, Any]:
+    """Decode a Redis hash of JSON values."""
+    return {
+        (key.decode("utf-8") if isinstance(key, bytes) else key): json.loads(value)
+        for key, value in values.items()
+    }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Keeps sessions in Redis (or any server speaking its protocol), shared by every worker and host.
+
+    Messages are a capped list, a counter numbers them, and the context is a hash with one JSON
+    value per key. Each operation is a single pipeline, and Redis expires idle sessions itself, so
+    no sweep is needed.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, max_messages: int, client: Any = None, prefix: str = "session"):
+        """
+        Connect to the session server.
+
+        Args:
+            url: The server URL, e.g. redis://localhost:6379/0, or memory:// for the in-process LocalRedis
+            ttl_seconds: How long a session may sit idle before it expires (0 disables expiry)
+            max_messages: Messages kept per session
+            client: An existing client to use instead of connecting to url
+            prefix: Prefix of every key written by the store
+        """
+        if client is None and url.startswith("memory://"):
+            logger.info("Using the in-process Redis stand-in as the session store")
+            client = LocalRedis()
+
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("The redis session store requires the 'redis' package (pip install redis)")
+
+            logger.info(f"Connecting to Redis session store at {url}")
+            client = redis.Redis.from_url(url)
+
+        # Raised when a watched key changes before the transaction runs; the stand-in does not need the package
+        try:
+            from redis.exceptions import WatchError
+            self._watch_errors = (WatchError, LocalWatchError)
+        except ImportError:
+            self._watch_errors = (LocalWatchError,)
+
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_messages = max_messages
+        self.prefix = prefix
+
+    def _keys(self, session_id: str):
+        """The message list, message counter and context hash keys of a session."""
+        return (
+            f"{self.prefix}:{session_id}:messages",
+            f"{self.prefix}:{session_id}:appended",
+            f"{self.prefix}:{session_id}:context"
+        )
+
+    def _expire(self, pipeline, *keys) -> None:
+        """Queue a TTL refresh for the given keys."""
+        if self.ttl_seconds > 0:
+            for key in keys:
+                pipeline.expire(key, self.ttl_seconds)
+
+    def get_messages(self, session_id: str, max_messages: Optional[int] = None) -> List[Mapping]:
+        messages_key, appended_key, _ = self._keys(session_id)
+        start = -max_messages if max_messages else 0
+
+        # Read the list and the counter in one transaction, so the newest message is number `appended`
+        pipeline = self.client.pipeline()
+        pipeline.lrange(messages_key, start, -1)
+        pipeline.get(appended_key)
+        messages, appended = pipeline.execute()
+
+        first = int(appended or len(messages)) - len(messages) + 1
+        return [
+            Message(**json.loads(message), seq=first + i)
+            for i, message in enumerate(messages)
+        ]
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        _, _, context_key = self._keys(session_id)
+        return _decode_hash(self.client.hgetall(context_key))
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        messages_key, appended_key, context_key = self._keys(session_id)
+
+        pipeline = self.client.pipeline()
+        pipeline.rpush(messages_key, *[
+            json.dumps({"role": message["role"], "content": message["content"]}) for message in messages
+        ])
+        pipeline.ltrim(messages_key, -self.max_messages, -1)
+        pipeline.incrby(appended_key, len(messages))
+        self._expire(pipeline, messages_key, appended_key, context_key)
+        pipeline.execute()
+
+    def update_context(self, session_id: str, updates: Dict[str, Any]) -> None:
+        if not updates:
+            return
+
+        messages_key, appended_key, context_key = self._keys(session_id)
+
+        pipeline = self.client.pipeline()
+        pipeline.hset(context_key, mapping={key: json.dumps(value, default=str) for key, value in updates.items()})
+        self._expire(pipeline, messages_key, appended_key, context_key)
+        pipeline.execute()
+
+    def modify_context(self, session_id: str, modify: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        messages_key, appended_key, context_key = self._keys(session_id)
+
+        # Optimistic locking: the transaction fails if another writer changed the context after it was read
+        with self.client.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(context_key)
+                    updates = modify(_decode_hash(pipeline.hgetall(context_key)))
+
+                    pipeline.multi()
+                    if updates:
+                        pipeline.hset(context_key, mapping={
+                            key: json.dumps(value, default=str) for key, value in updates.items()
+                        })
+                    self._expire(pipeline, messages_key, appended_key, context_key)
+                    pipeline.execute()
+                    return updates
+
+                except self._watch_errors:
+                    continue
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(*self._keys(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "ttl_seconds": self.ttl_seconds}
+
+    def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class TurnLog:
+    """
+    An append-only NDJSON log of the questions the language model answered, and its answers.
+
+    Each line is {"time": ..., "question": ..., "answer": ..., "history": ...}, where history tells
+    whether earlier messages of the conversation were sent with the question. The log feeds offline
+    jobs such as FAQ mining; nothing reads it on the request path.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the turn log.
+
+        Args:
+            path: The NDJSON file to append to
+        """
+        logger.info(f"Logging model turns to {path}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._file = open(path, 'a', encoding="utf-8")
+        self._lock = threading.Lock()
+        self._written = 0
+
+    def append(self, question: str, answer: str, has_history: bool = False) -> None:
+        """
+        Log one model turn.
+
+        Args:
+            question: The user's message
+            answer: The model's response
+            has_history: Whether the prompt carried earlier messages or a summary of them
+        """
+        line = json.dumps({
+            "time": round(time.time(), 3),
+            "question": question,
+            "answer": answer,
+            "history": has_history
+        }) + "\n"
+
+        try:
+            # One write per line keeps lines whole when several workers share the file
+            with self._lock:
+                self._file.write(line)
+                self._file.flush()
+                self._written += 1
+
+        except Exception as e:
+            logger.error(f"Error writing to turn log {self.path}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get logging statistics.
+
+        Returns:
+            A dictionary with the number of turns written by this process
+        """
+        with self._lock:
+            return {"path": self.path, "written": self._written}
+
+    def close(self) -> None:
+        """Close the log file."""
+        with self._lock:
+            self._file.close()
+
+
+def read_turns(path: str) -> Iterator[Dict]:
+    """
+    Yield the turns of a log, skipping lines that cannot be parsed.
+
+    Args:
+        path: The NDJSON turn log
+
+    Returns:
+        An iterator of {"time", "question", "answer", "history"} dictionaries
+    """
+    with open(path, 'r', encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+
+            try:
+                turn = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping invalid line {line_number} of {path}")
+                continue
+
+            if isinstance(turn, dict) and turn.get("question") and turn.get("answer"):
+                yield turn
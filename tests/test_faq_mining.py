@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+
+from services.faq_mining import aggregate_turns, build_candidates
+
+
+def turn(question, answer, history=False):
+    return {"question": question, "answer": answer, "history": history}
+
+
+def test_reasoning_is_not_mined_into_faq_answers():
+    # Each logged answer carries its own reasoning; the answer after it is the same every time
+    turns = [
+        turn("How long do returns take?", f"<think>\nAttempt {i}: the policy says 30 days.\n</think>\n\nReturns are accepted for 30 days.")
+        for i in range(5)
+    ]
+    turns.append(turn("how long do returns take", "Returns are accepted for 30 days."))
+
+    entries = aggregate_turns(turns)
+
+    assert len(entries) == 1
+    assert entries[0]["count"] == 6
+    assert dict(entries[0]["answers"]) == {"Returns are accepted for 30 days.": 6}
+
+    candidates = build_candidates(entries, [0], [1.0], min_similarity=0.5, min_count=5)
+
+    assert candidates[0]["answer"] == "Returns are accepted for 30 days."
+    assert "</think>" not in candidates[0]["answer"]
+
+
+def test_turns_with_history_or_only_reasoning_are_skipped():
+    turns = [
+        turn("And the second one?", "It shipped yesterday.", history=True),
+        turn("Where is my parcel?", "<think>\nThe budget ran out before an answer.\n</think>\n\n")
+    ]
+
+    assert aggregate_turns(turns) == []
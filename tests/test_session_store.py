@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from services.session_store import InMemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+TTL_SECONDS = 60
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock for time.time and time.monotonic that only moves when the test advances it."""
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    def advance(seconds):
+        now[0] += seconds
+
+    return advance
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = InMemorySessionStore(100, TTL_SECONDS, 10 ** 8, 20)
+    elif request.param == "sqlite":
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), TTL_SECONDS, 20)
+    else:
+        store = RedisSessionStore("memory://", TTL_SECONDS, 20)
+
+    yield store
+    store.close()
+
+
+def start_session(store, session_id):
+    store.append_messages(session_id, [{"role": "user", "content": "secret old"}])
+    store.update_context(session_id, {"k": "old"})
+
+
+def test_append_after_expiry_starts_a_new_session(store, clock):
+    start_session(store, "s1")
+    clock(TTL_SECONDS + 1)
+
+    store.append_messages("s1", [{"role": "user", "content": "new"}])
+
+    assert [message["content"] for message in store.get_messages("s1")] == ["new"]
+    assert store.get_context("s1") == {}
+
+
+def test_context_update_after_expiry_starts_a_new_session(store, clock):
+    start_session(store, "s1")
+    clock(TTL_SECONDS + 1)
+
+    store.update_context("s1", {"k": "new"})
+
+    assert store.get_messages("s1") == []
+    assert store.get_context("s1") == {"k": "new"}
+
+
+def test_writes_before_expiry_keep_the_session(store, clock):
+    start_session(store, "s1")
+    clock(TTL_SECONDS - 1)
+
+    store.append_messages("s1", [{"role": "user", "content": "new"}])
+
+    assert [message["content"] for message in store.get_messages("s1")] == ["secret old", "new"]
+    assert store.get_context("s1") == {"k": "old"}